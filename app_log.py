@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+動作ログ（approval-notify.log）
+・コンソールなしの exe でも調査できるよう、1行1件の JSON で書き出す
+・書き込みはキュー経由で専用スレッドが行うため、Tk のループや取得スレッドはディスク待ちで止まらない
+・サイズで切り替え、古いログは approval-notify.log.1 〜 .3 として残す
+
+  log = logging.getLogger(__name__)
+  log.info("取得完了", extra={"status": 200, "elapsed": 0.12})
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+LOG_FILE = "approval-notify.log"
+MAX_BYTES = 1024 * 1024  # 1ファイルの上限
+BACKUP_COUNT = 3
+
+# LogRecord が標準で持つ属性（これ以外は extra として出力する）
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """時刻・レベル・発生元・本文と extra の値を1行の JSON にする"""
+
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+                    + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """
+    標準の QueueHandler.prepare は例外のトレースバックを本文に連結して exc_info を捨てるため、
+    書き出し側で exc を別の項目にできない。ここでは本文の組み立てだけ行い、
+    例外・スタックはそのまま渡して書き出しスレッドで整形する（呼び出し側の負担も減る）。
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener = None
+
+
+def setup_logging(path=LOG_FILE, level=logging.INFO):
+    """ルートロガーをキュー経由のファイル出力に切り替える（2回目以降は何もしない）"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    handlers = []
+    try:
+        file_handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding="utf-8", delay=True)
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    except OSError as e:
+        print("ログファイル作成エラー:", e)
+    if sys.stderr is not None:
+        # コンソール付きで起動した時は従来どおり画面にも出す（--noconsole では stderr が None）
+        console = logging.StreamHandler()
+        console.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+        handlers.append(console)
+
+    # キューは上限なし：put は待たないため、呼び出し側のコストはレコード作成のみ
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(StructuredQueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+    # 捕捉されなかった例外（メイン・各スレッド）も記録する
+    def excepthook(exc_type, exc, tb):
+        logging.getLogger("unhandled").critical("未処理の例外", exc_info=(exc_type, exc, tb))
+    sys.excepthook = excepthook
+    threading.excepthook = lambda args: excepthook(args.exc_type, args.exc_value, args.exc_traceback)
+    return _listener
+
+
+def stop_logging():
+    """キューに残ったログを書き出してから停止（終了・再起動の直前に呼ぶ）"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
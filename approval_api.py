@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+承認API クライアント（接続プール + 条件付きリクエスト）
+・requests.Session を使い回して DNS / TCP / TLS ハンドシェイクを毎回払わない
+・ETag / Last-Modified を保存し、変化なしなら 304（本文なし）で済ませる
+・リクエストごとの所要時間・ステータスを記録
+・同じユーザーへの同時リクエストは1本にまとめ、結果を共有（シングルフライト）
+・新規接続時の DNS / TCP / TLS 時間を計測し、metrics に記録
+・連続して失敗したら一時的に送信を止め（サーキットブレーカー）、一定時間ごとに1本だけ試す
+・requests は起動を速くするため最初のクライアント生成時（取得スレッド上）に読み込む
+"""
+
+import logging
+import socket
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import get_metrics
+
+# ======================
+# 定数設定
+# ======================
+API_URL = "https://akioka.cloud/api/order_request/approval_requests"
+TIMEOUT = 10
+POOL_SIZE = 4
+FAILURE_THRESHOLD = 3     # 連続失敗がこの回数に達したら送信を止める
+RESET_TIMEOUT = 60        # 停止から試行（1本だけ送る）までの秒数
+MAX_RESET_TIMEOUT = 600   # 試行も失敗した場合は倍々に延ばす（上限）
+
+log = logging.getLogger(__name__)
+
+# data        : レスポンスJSON（304 の場合は前回の内容、失敗時は None）
+# status      : HTTPステータス（通信失敗時は None）
+# elapsed     : リクエスト所要時間（秒）
+# not_modified: 304 で前回値を再利用したか
+# size        : 受信した本文のバイト数
+# error       : 通信例外（なければ None）
+# timing      : 新規接続した場合の {"dns", "connect", "tls"}（秒）。接続を再利用した場合は 0
+FetchResult = namedtuple("FetchResult", "data status elapsed not_modified size error timing")
+
+# ======================
+# 接続時間の計測
+# ======================
+_conn_timing = threading.local()  # リクエストを行ったスレッドごとの接続時間
+
+
+class _TimedSocketModule:
+    """urllib3 の接続処理から見える socket モジュール。getaddrinfo の時間だけを記録し、
+    それ以外はそのまま socket に任せる（名前解決を計測のために余分に行わない）"""
+
+    def __getattr__(self, name):
+        return getattr(socket, name)
+
+    @staticmethod
+    def getaddrinfo(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return socket.getaddrinfo(*args, **kwargs)
+        finally:
+            _conn_timing.dns = time.perf_counter() - start
+
+
+def _timed_connection(base):
+    """urllib3 の接続クラスを包み、名前解決・TCP接続・TLSハンドシェイクの時間を記録"""
+
+    class TimedConnection(base):
+        def _new_conn(self):
+            _conn_timing.dns = 0.0
+            start = time.perf_counter()
+            conn = super()._new_conn()  # 名前解決は _TimedSocketModule で計測
+            _conn_timing.connect = time.perf_counter() - start - _conn_timing.dns
+            return conn
+
+        def connect(self):
+            start = time.perf_counter()
+            super().connect()
+            opened = getattr(_conn_timing, "dns", 0.0) + getattr(_conn_timing, "connect", 0.0)
+            _conn_timing.tls = max(0.0, time.perf_counter() - start - opened)
+
+    return TimedConnection
+
+
+def _install_timing(adapter):
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+    from urllib3.util import connection
+
+    if not isinstance(connection.socket, _TimedSocketModule):
+        connection.socket = _TimedSocketModule()
+
+    class TimedHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = _timed_connection(HTTPConnection)
+
+    class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = _timed_connection(HTTPSConnection)
+
+    adapter.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool,
+                                                  "https": TimedHTTPSConnectionPool}
+
+
+class SingleFlight:
+    """同じキーの同時呼び出しは最初の1回だけ実行し、待っていた呼び出しにも同じ結果を返す"""
+
+    def __init__(self):
+        self.calls = 0  # 実際に実行した回数
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = {"done": threading.Event(),
+                                              "result": None, "error": None}
+                self.calls += 1
+        if not leader:
+            call["done"].wait()
+        else:
+            try:
+                call["result"] = fn(*args)
+            except BaseException as e:
+                call["error"] = e
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+                call["done"].set()
+        if call["error"] is not None:
+            raise call["error"]
+        return call["result"]
+
+
+class CircuitOpenError(Exception):
+    """サーキットブレーカー作動中のため送信しなかった"""
+
+
+class CircuitBreaker:
+    """
+    closed    : 通常どおり送信。連続 threshold 回失敗したら open へ
+    open      : 送信せず即失敗。reset_timeout 秒後に half_open へ
+    half_open : 1本だけ試行し、成功なら closed、失敗なら待ち時間を倍にして open へ
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT,
+                 max_reset_timeout=MAX_RESET_TIMEOUT, clock=time.monotonic):
+        self.threshold = threshold
+        self.base_timeout = reset_timeout
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """送信してよいか。half_open では試行中の1本以外は False"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    return False
+                self._set(self.HALF_OPEN)
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            self.reset_timeout = self.base_timeout
+            if self.state != self.CLOSED:
+                self._set(self.CLOSED)
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+                self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+                self._open()
+            elif self.state == self.CLOSED and self.failures >= self.threshold:
+                self._open()
+
+    def _open(self):
+        self.opened_at = self.clock()
+        self._set(self.OPEN)
+
+    def _set(self, state):
+        log.warning("サーキットブレーカー: %s → %s", self.state, state,
+                    extra={"failures": self.failures, "reset_timeout": self.reset_timeout})
+        self.state = state
+
+
+def _is_failure(result):
+    """サーバー側の障害とみなす結果（通信失敗・5xx・429）"""
+    return result.error is not None or result.status is None or \
+        result.status >= 500 or result.status == 429
+
+
+class ApprovalClient:
+    """
+    承認APIへの持続接続クライアント（スレッドセーフ）
+    per_user_breaker=True ならユーザーごとに別のブレーカーを使い、1名の失敗で他のユーザーへの
+    送信を止めない（headless の --users など）。既定はクライアント全体で1つ（breaker）。
+    """
+
+    def __init__(self, api_url=API_URL, timeout=TIMEOUT, pool_size=POOL_SIZE,
+                 per_user_breaker=False):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.api_url = api_url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        _install_timing(adapter)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.last_result = None
+        self.breaker = CircuitBreaker()
+        self._breakers = {} if per_user_breaker else None  # user_id -> CircuitBreaker
+        self._executor = None
+        self._flight = SingleFlight()
+        self._cache = {}  # user_id -> {"etag", "last_modified", "data"}
+        self._lock = threading.Lock()
+
+    def request(self, user_id):
+        """1回分のリクエストを行い FetchResult を返す（同時呼び出しは1本にまとめる）"""
+        return self._flight.do(user_id, self._timed_request, user_id)
+
+    def breaker_for(self, user_id):
+        """user_id への送信に使うブレーカー（per_user_breaker でなければ breaker）"""
+        if self._breakers is None:
+            return self.breaker
+        with self._lock:
+            breaker = self._breakers.get(user_id)
+            if breaker is None:
+                breaker = self._breakers[user_id] = CircuitBreaker()
+            return breaker
+
+    def _timed_request(self, user_id):
+        breaker = self.breaker_for(user_id)
+        if not breaker.allow():
+            # 作動中は送信せず失敗扱い（表示は呼び出し側の前回値・cached() を使う）
+            get_metrics().incr("short_circuited")
+            result = FetchResult(None, None, 0.0, False, 0, CircuitOpenError(breaker.state), None)
+            self.last_result = result
+            return result
+        _conn_timing.__dict__.clear()
+        result = self._request(user_id)
+        if _is_failure(result):
+            breaker.failure()
+        else:
+            breaker.success()
+        result = self._record(result)
+        log.debug("取得", extra={"user_id": user_id, "status": result.status,
+                                 "elapsed": round(result.elapsed, 4), "size": result.size,
+                                 "not_modified": result.not_modified})
+        self.last_result = result
+        return result
+
+    def _record(self, result):
+        """1回分のリクエストを新規接続の時間とともに metrics に記録し、timing を付けて返す"""
+        timing = {k: getattr(_conn_timing, k, 0.0) for k in ("dns", "connect", "tls")}
+        get_metrics().record_poll(result.status, result.elapsed, result.size,
+                                  not_modified=result.not_modified, error=result.error,
+                                  **timing)
+        return result._replace(timing=timing)
+
+    def _request(self, user_id):
+        with self._lock:
+            cached = self._cache.get(user_id)
+        headers = {}
+        if cached:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        start = time.perf_counter()
+        try:
+            res = self.session.get(self.api_url, params={"user_id": user_id},
+                                   headers=headers, timeout=self.timeout)
+            body = res.content
+        except Exception as e:
+            return FetchResult(None, None, time.perf_counter() - start, False, 0, e, None)
+        elapsed = time.perf_counter() - start
+
+        if res.status_code == 304 and cached:
+            result = FetchResult(cached["data"], 304, elapsed, True, len(body), None, None)
+        elif res.status_code == 200:
+            try:
+                data = res.json()
+            except ValueError as e:
+                return FetchResult(None, 200, elapsed, False, len(body), e, None)
+            etag = res.headers.get("ETag")
+            last_modified = res.headers.get("Last-Modified")
+            with self._lock:
+                if etag or last_modified:
+                    self._cache[user_id] = {"etag": etag, "last_modified": last_modified,
+                                            "data": data}
+                else:
+                    self._cache.pop(user_id, None)
+            result = FetchResult(data, 200, elapsed, False, len(body), None, None)
+        else:
+            result = FetchResult(None, res.status_code, elapsed, False, len(body), None, None)
+        return result
+
+    def fetch(self, user_id):
+        """従来の fetch_data 互換：成功時は dict、失敗時は None"""
+        result = self.request(user_id)
+        if isinstance(result.error, CircuitOpenError):
+            log.debug("送信停止中", extra={"user_id": user_id,
+                                            "breaker": self.breaker_for(user_id).state})
+        elif result.error is not None:
+            log.warning("APIエラー: %s", result.error,
+                        extra={"user_id": user_id, "elapsed": round(result.elapsed, 4)})
+        elif result.data is None:
+            log.warning("HTTPエラー: %s", result.status,
+                        extra={"user_id": user_id, "status": result.status})
+        return result.data
+
+    def cached(self, user_id):
+        """最後に取得できた件数（ETag 付きで受け取った場合のみ保持）。なければ None"""
+        with self._lock:
+            cached = self._cache.get(user_id)
+        return cached["data"] if cached else None
+
+    def version(self, user_id):
+        """最後に受け取った件数レスポンスの版（ETag / Last-Modified）。なければ None"""
+        with self._lock:
+            cached = self._cache.get(user_id)
+        return (cached["etag"] or cached["last_modified"]) if cached else None
+
+    def fetch_items(self, items_url, user_id, page, per_page):
+        """
+        承認待ち明細の1ページ分を返す。失敗時は None
+        GET items_url?user_id=2&page=0&per_page=50
+        → {"items": [{"id", "title", "requester", "created_at", "level"}, ...], "total": 120}
+        """
+        _conn_timing.__dict__.clear()
+        start = time.perf_counter()
+        try:
+            res = self.session.get(items_url, timeout=self.timeout,
+                                   params={"user_id": user_id, "page": page, "per_page": per_page})
+            body = res.content
+        except Exception as e:
+            self._record(FetchResult(None, None, time.perf_counter() - start, False, 0, e, None))
+            log.warning("APIエラー: %s", e, extra={"user_id": user_id, "page": page})
+            return None
+        self._record(FetchResult(None, res.status_code, time.perf_counter() - start, False,
+                                 len(body), None, None))
+        if res.status_code != 200:
+            log.warning("HTTPエラー: %s", res.status_code,
+                        extra={"user_id": user_id, "page": page, "status": res.status_code})
+            return None
+        try:
+            return res.json()
+        except ValueError as e:
+            log.warning("APIエラー: %s", e, extra={"user_id": user_id, "page": page})
+            return None
+
+    def fetch_many(self, user_ids, batch_url=None):
+        """
+        複数ユーザー分を取得し {user_id: data} を返す（失敗したユーザーは含めない）
+        batch_url 指定時 : GET batch_url?user_ids=2,5,7 の1回で取得
+                           （レスポンスは {"2": {...}, "5": {...}} 形式）
+        未指定時         : 接続プールと同数のスレッドで並行取得
+        """
+        if batch_url:
+            return self._fetch_batch(user_ids, batch_url)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=POOL_SIZE,
+                                                    thread_name_prefix="approval-fetch")
+        results = self._executor.map(self.fetch, user_ids)
+        return {uid: data for uid, data in zip(user_ids, results) if data}
+
+    def _fetch_batch(self, user_ids, batch_url):
+        if not self.breaker.allow():
+            get_metrics().incr("short_circuited")
+            return {}
+        _conn_timing.__dict__.clear()
+        start = time.perf_counter()
+        try:
+            res = self.session.get(batch_url,
+                                   params={"user_ids": ",".join(str(u) for u in user_ids)},
+                                   timeout=self.timeout)
+            content = res.content
+        except Exception as e:
+            self._record(FetchResult(None, None, time.perf_counter() - start, False, 0, e, None))
+            log.warning("APIエラー: %s", e, extra={"user_ids": user_ids})
+            self.breaker.failure()
+            return {}
+        self._record(FetchResult(None, res.status_code, time.perf_counter() - start, False,
+                                 len(content), None, None))
+        if res.status_code != 200:
+            log.warning("HTTPエラー: %s", res.status_code,
+                        extra={"user_ids": user_ids, "status": res.status_code})
+            if res.status_code >= 500 or res.status_code == 429:
+                self.breaker.failure()
+            else:
+                self.breaker.success()
+            return {}
+        try:
+            body = res.json()
+        except ValueError as e:
+            log.warning("APIエラー: %s", e, extra={"user_ids": user_ids})
+            self.breaker.failure()
+            return {}
+        self.breaker.success()
+        return {uid: body[str(uid)] for uid in user_ids if str(uid) in body}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+def aggregate_counts(per_user):
+    """ユーザーごとの件数を合算する（内訳は "users" に残す）"""
+    total = {"order_requests_count": 0, "danger_count": 0, "alert_count": 0}
+    for data in per_user.values():
+        for key in total:
+            total[key] += data.get(key, 0)
+    total["users"] = per_user
+    return total
+
+
+# ======================
+# 共有クライアント
+# ======================
+_client = None
+_client_api_url = API_URL
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """プロセス内で共有する ApprovalClient を返す"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ApprovalClient(api_url=_client_api_url)
+        return _client
+
+
+def breaker_state():
+    """共有クライアントのブレーカー状態（未作成なら closed。requests を読み込まない）"""
+    client = _client
+    return client.breaker.state if client is not None else CircuitBreaker.CLOSED
+
+
+def configure_client(api_url=None):
+    """共有クライアントの接続先を変更する（拠点リレー利用時など）。None なら既定の API_URL"""
+    global _client_api_url
+    with _client_lock:
+        _client_api_url = api_url or API_URL
+        if _client is not None:
+            _client.api_url = _client_api_url
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+バッジ画像レンダラ（Pillow）
+・高解像度で描いて縮小することでアンチエイリアスの効いた円形バッジを生成
+・影は3重の円ではなくぼかしで描画
+・(サイズ, 色, 件数) ごとに LRU キャッシュし、同じ状態やリサイズの往復は再描画しない
+"""
+
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+SUPERSAMPLE = 4         # 描画倍率（縮小時にアンチエイリアスがかかる）
+CACHE_SIZE = 64
+LABEL_TEXT = "承認待ち"
+STALE_ALPHA = 110       # 古い値を表示する時の不透明度（0-255）
+
+COUNT_FONTS = ["segoeuib.ttf", "arialbd.ttf", "DejaVuSans-Bold.ttf"]
+LABEL_FONTS = ["YuGothM.ttc", "meiryo.ttc", "msgothic.ttc",
+               "NotoSansCJK-Regular.ttc", "DejaVuSans.ttf"]
+
+
+@lru_cache(maxsize=32)
+def _font(candidates, px):
+    for name in candidates:
+        try:
+            return ImageFont.truetype(name, px)
+        except OSError:
+            continue
+    try:
+        return ImageFont.load_default(px)
+    except TypeError:  # Pillow 10.1 未満
+        return ImageFont.load_default()
+
+
+def render_badge(size, color, count, label=LABEL_TEXT, stale=False):
+    """バッジ画像（RGBA, size x size）を1枚描画する
+    stale=True の場合は全体を半透明にして古い値であることを示す"""
+    s = SUPERSAMPLE
+    big = size * s
+    r = int(size / 2.2) * s
+    cx = cy = big // 2
+
+    # ソフトな外側の影
+    shadow = Image.new("L", (big, big), 0)
+    ImageDraw.Draw(shadow).ellipse((cx - r - 3 * s, cy - r - 2 * s,
+                                    cx + r + 3 * s, cy + r + 4 * s), fill=150)
+    img = Image.new("RGBA", (big, big), (10, 10, 10, 0))
+    img.putalpha(shadow.filter(ImageFilter.GaussianBlur(3 * s)))
+
+    # メインの円形バッジ
+    d = ImageDraw.Draw(img)
+    d.ellipse((cx - r, cy - r, cx + r, cy + r), fill=color)
+
+    # 件数・下部ラベル（Tk のポイント指定に合わせて px 換算）
+    if label:
+        count_px = max(10, int(size / 2.8)) * 4 // 3 * s
+        d.text((cx, cy - int(size * 0.05) * s), str(count), fill="white", anchor="mm",
+               font=_font(tuple(COUNT_FONTS), count_px))
+        label_px = max(8, int(size / 9)) * 4 // 3 * s
+        d.text((cx, cy + int(size * 0.18) * s), label, fill="white", anchor="mm",
+               font=_font(tuple(LABEL_FONTS), label_px))
+    else:
+        # トレイ用など小サイズでは件数のみ。3桁以上は文字を詰める
+        text = str(count)
+        d.text((cx, cy), text, fill="white", anchor="mm",
+               font=_font(tuple(COUNT_FONTS), int(r * (1.1 if len(text) <= 2 else 0.75))))
+
+    if stale:
+        img.putalpha(img.getchannel("A").point(lambda a: a * STALE_ALPHA // 255))
+
+    return img.resize((size, size), Image.LANCZOS)
+
+
+class BadgeRenderer:
+    """
+    render_badge の結果を LRU キャッシュする。
+    convert を渡すと変換後（ImageTk.PhotoImage など）の値をキャッシュする。
+    hits / misses / render_time で効果を計測できる。
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, convert=None, label=LABEL_TEXT):
+        self.maxsize = maxsize
+        self.convert = convert
+        self.label = label
+        self.hits = 0
+        self.misses = 0
+        self.render_time = 0.0
+        self._cache = OrderedDict()
+
+    def render(self, size, color, count, stale=False):
+        key = (size, color, count, stale)
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        self.misses += 1
+        start = time.perf_counter()
+        image = render_badge(size, color, count, self.label, stale)
+        if self.convert:
+            image = self.convert(image)
+        self.render_time += time.perf_counter() - start
+
+        self._cache[key] = image
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return image
+
+    def set_label(self, label):
+        """下部ラベルを変更（描画済みの画像は作り直すため破棄）"""
+        if label != self.label:
+            self.label = label
+            self._cache.clear()
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def avg_render_ms(self):
+        return self.render_time / self.misses * 1000 if self.misses else 0.0
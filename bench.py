@@ -0,0 +1,1044 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ベンチマーク一式（結果は JSON で出力し、前回との比較に使う）
+・fetch     : スタブAPI（stub_api.py）に対する取得スループットと応答時間、計測処理（metrics への記録・
+              接続時間の計測）を入れたことによる1回あたりの追加時間
+・scheduler : 件数の推移・障害を模した1日分の取得回数（時刻は仮想）
+・memory    : 長時間ポーリングを模した際のメモリ増加（tracemalloc）
+・users     : N 名の監視を1プロセスでまとめる（batch_url / 接続プール）か、1名ずつ別のクライアント
+              （1名1プロセス相当）で行うかの、リクエスト数・接続数・スレッド数・メモリ
+・notify    : 記録したレスポンス列（notify_engine.replay）で、差分・id 単位の重複排除・間引きの結果
+              表示されるポップアップ数が想定どおりか
+・breaker   : 障害を注入したスタブで、停止中の実リクエストが試行分まで減るか
+・relay     : 拠点リレー（relay.py）越しに多数の端末が同時に取得した時の、上流（スタブ）へのリクエスト数
+・push      : スタブの push エンドポイント（SSE / ロングポーリング）で、件数の変化から
+              受信コールバック（バッジ更新の依頼）までの時間と、無通信中の stop() の所要時間
+・presence  : 在席状態を模した1日分で、離席中の停止により減る取得回数と復帰時の鮮度
+・settings  : 書き込み途中の停止（置き換え前の失敗）・壊れたファイルの読み込みで元の設定が守られるか、
+              連続した保存（Ctrl+ホイール）が1回の書き込み・1本のスレッドにまとまるか
+・reload    : 実行中の headless.py の設定ファイルを書き換えてから、新しい設定で取得するまでの時間
+              （自分の保存は設定ファイルの監視で読み直さないことも確認）
+・core      : 待機中（件数に変化なし）のコアループの起床回数・Tk を起こす回数・増えるスレッド数
+              （時間を CORE_SPEED 倍に早めて実行し、1分あたりに換算）
+              応答の遅いスタブに対して取得を続けている間の、UI ループ（mainloop 相当）の遅れ
+・render    : バッジ描画（draw_badge 相当）とポップアップ表示の時間
+              画面が必要（Linux では Xvfb 上で DISPLAY を設定して実行）
+・log       : ログ1件あたりに呼び出し側（Tk スレッドなど）が払う時間（キュー経由 / ファイルへ直接）と、
+              例外が exc として別項目に書き出されるか
+・tk_calls  : バッジの更新1回・Ctrl+ホイールのリサイズ1段階あたりに発行される Tcl コマンド数
+              （以前の全消去・再作成 / アイテムの部分更新 / 現在の画像差し替え を比較。画面は不要）
+
+  python bench.py                         … 全項目を実行し JSON を標準出力へ
+  python bench.py --only fetch,memory --out bench_output.json
+  xvfb-run python bench.py --only render
+"""
+
+import argparse
+import gc
+import json
+import logging
+import logging.handlers
+import os
+import platform
+import queue
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from app_log import JsonFormatter, StructuredQueueHandler
+from approval_api import ApprovalClient, CircuitBreaker
+from core_loop import AsyncPoller, CoreLoop
+from metrics import RING_SIZE, Metrics, get_metrics
+from notify_engine import NotificationEngine, replay
+from presence import AWAY, IDLE, IDLE_FACTOR, PRESENCE_INTERVAL, PresenceMonitor, StubPresence
+from push_client import PushListener
+from relay import create_server
+from scheduler import PollScheduler
+from settings_store import (DEFAULT_SETTING, SETTING_FILE, WATCH_INTERVAL, SettingsWatcher,
+                            flush_settings, load_settings, save_settings, write_settings)
+from stub_api import StubServer
+
+SECTIONS = ("fetch", "scheduler", "memory", "users", "notify", "breaker", "relay", "push", "presence", "settings", "reload", "core", "render", "tk_calls", "log")
+DAY = 24 * 3600
+CORE_SPEED = 20  # core の時間の早送り倍率（1分を3秒で回す）
+PREVIOUS_PUMP_INTERVAL = 100  # 以前の Tk 側の結果確認間隔（ミリ秒）
+
+
+def _ms(values):
+    ordered = sorted(values)
+    return {"p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+            "mean_ms": round(statistics.mean(ordered) * 1000, 3)}
+
+
+# ======================
+# 取得スループット
+# ======================
+def bench_fetch(quick=False, latency=0.02):
+    """
+    スレッド数を変えて、ユーザーごとの取得を繰り返した時の req/s と応答時間。
+    new_connections は新規接続（TCP / TLS ハンドシェイク）の回数で、接続を使い回せていれば
+    取得回数によらずスレッド数（プールの接続数）以下にとどまる。
+    """
+    results = {}
+    per_thread = 20 if quick else 100
+    counters = get_metrics().counters
+    for threads in (1, 4, 16):
+        stub = StubServer(latency=latency, counts=[(3, 0, 1), (4, 1, 1)]).start()
+        client = ApprovalClient(api_url=stub.url, pool_size=threads)
+        connections_before = counters.get("connections", 0)
+
+        def run(uid):
+            return [client.request(uid).elapsed for _ in range(per_thread)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            elapsed = [e for chunk in pool.map(run, range(threads)) for e in chunk]
+        wall = time.perf_counter() - start
+        results[f"threads_{threads}"] = dict(
+            requests=len(elapsed), req_per_s=round(len(elapsed) / wall, 1),
+            not_modified=stub.not_modified,
+            new_connections=counters.get("connections", 0) - connections_before, **_ms(elapsed))
+        client.close()
+        stub.stop()
+    results["coalesced"] = _bench_coalesce()
+    results["instrumentation"] = _bench_instrumentation(quick)
+    results["stub_latency_ms"] = latency * 1000
+    return results
+
+
+def _bench_coalesce(callers=20, latency=0.2):
+    """同じユーザーへの同時取得（即時取得の連打など）が上流への1回にまとまるか"""
+    stub = StubServer(latency=latency, counts=[(3, 0, 1)]).start()
+    client = ApprovalClient(api_url=stub.url)
+    barrier = threading.Barrier(callers)
+
+    def call(_):
+        barrier.wait()
+        return client.fetch(2)
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        got = list(pool.map(call, range(callers)))
+    client.close()
+    stub.stop()
+    return {"callers": callers, "upstream_requests": stub.requests,
+            "all_received": all(data is not None for data in got)}
+
+
+def _bench_instrumentation(quick=False):
+    """
+    record_poll_us : metrics.record_poll 1回の時間
+    reused_us      : 接続を使い回す取得1回あたり、素の requests.Session より余分にかかる時間（中央値）
+                     （ブレーカー・シングルフライト・ETag 保存・記録を含む）
+    new_conn_us    : 新規接続する取得1回あたり、計測用の接続クラスで余分にかかる時間
+    """
+    import requests
+    from approval_api import _install_timing
+    rounds = 500 if quick else 3000
+    metrics = Metrics()
+    start = time.perf_counter()
+    for _ in range(rounds * 10):
+        metrics.record_poll(200, 0.01, 64, dns=0.001, connect=0.002)
+    record_us = (time.perf_counter() - start) / (rounds * 10) * 1e6
+
+    stub = StubServer(counts=[(3, 0, 1), (4, 1, 1)]).start()
+
+    def compare(plain_call, timed_call, n):
+        """交互に n 回ずつ呼び、1回あたりの中央値（マイクロ秒）を返す"""
+        plain_call(), timed_call()  # 接続の確立・初回の読み込みを除く
+        times = ([], [])
+        for _ in range(n):
+            for fn, out in zip((plain_call, timed_call), times):
+                start = time.perf_counter()
+                fn()
+                out.append(time.perf_counter() - start)
+        return [statistics.median(t) * 1e6 for t in times]
+
+    def session(timed):
+        s = requests.Session()
+        adapter = requests.adapters.HTTPAdapter()
+        if timed:
+            _install_timing(adapter)
+        s.mount("http://", adapter)
+        return s
+
+    plain = session(False)
+    client = ApprovalClient(api_url=stub.url)
+    reused = compare(lambda: plain.get(stub.url, params={"user_id": 2}).content,
+                     lambda: client.request(2), rounds)
+
+    def fresh(s):
+        def call():
+            s.get(stub.url, params={"user_id": 2}).content
+            s.close()  # 接続を捨て、次の取得で接続し直させる
+        return call
+    timed = session(True)
+    new_conn = compare(fresh(plain), fresh(timed), rounds // 5)
+    plain.close()
+    client.close()
+    stub.stop()
+    return {"record_poll_us": round(record_us, 2),
+            "reused_plain_us": round(reused[0], 1), "reused_us": round(reused[1] - reused[0], 1),
+            "new_conn_plain_us": round(new_conn[0], 1),
+            "new_conn_us": round(new_conn[1] - new_conn[0], 1)}
+
+
+# ======================
+# スケジューラ
+# ======================
+def _simulate_day(counts_at, interval=60, fail_at=lambda t: False):
+    """仮想時刻で1日分を回し、取得回数と間隔の分布を返す"""
+    now = [0.0]
+    scheduler = PollScheduler(interval, clock=lambda: now[0], rand=lambda: 0.5)
+    gaps = []
+    polls = 0
+    while now[0] < DAY:
+        polls += 1
+        data = None if fail_at(now[0]) else dict(zip(
+            ("order_requests_count", "danger_count", "alert_count"), counts_at(now[0])))
+        delay = scheduler.record(data)
+        gaps.append(delay)
+        now[0] += delay
+    return {"polls_per_day": polls, "min_gap_s": round(min(gaps), 1),
+            "max_gap_s": round(max(gaps), 1), "fixed_interval_polls": DAY // interval}
+
+
+def bench_scheduler(quick=False):
+    hour = 3600
+    return {
+        # 件数がほとんど変わらない日（9時と15時に1件ずつ増える）
+        "stable": _simulate_day(lambda t: (3 + (t > 9 * hour) + (t > 15 * hour), 0, 0)),
+        # 日中に至急案件が2時間残る日
+        "danger": _simulate_day(lambda t: (5, 1 if 10 * hour < t < 12 * hour else 0, 0)),
+        # 13〜14時にAPIが停止する日
+        "outage": _simulate_day(lambda t: (3, 0, 0),
+                                fail_at=lambda t: 13 * hour < t < 14 * hour),
+    }
+
+
+# ======================
+# メモリ
+# ======================
+def bench_memory(quick=False):
+    """
+    取得 → 通知判定 → 計測値記録を繰り返し、計測開始後のメモリ推移を見る。
+    最初の区間は接続・キャッシュ・計測値のリングバッファなどの確保で増えるため、
+    増加量は2区間目以降で評価する。
+    """
+    polls = 2000 if quick else 20000
+    window = max(polls // 10, 2 * RING_SIZE)
+    stub = StubServer(counts=[(3, 0, 1), (3, 0, 1), (4, 1, 1), (2, 0, 0)]).start()
+    client = ApprovalClient(api_url=stub.url)
+    engine = NotificationEngine(min_interval=0)
+
+    def run(n):
+        for i in range(n):
+            result = client.request(i % 50)
+            if result.data:
+                engine.process(result.data)
+
+    tracemalloc.start()
+    run(window)
+    gc.collect()
+    samples = [tracemalloc.get_traced_memory()[0]]
+    start = time.perf_counter()
+    for _ in range(polls // window):
+        run(window)
+        gc.collect()
+        samples.append(tracemalloc.get_traced_memory()[0])
+    wall = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    client.close()
+    stub.stop()
+    done = window * (len(samples) - 1)
+    growth = samples[-1] - samples[0]
+    return {"polls": done, "growth_bytes": growth,
+            "growth_bytes_per_1000_polls": round(growth / done * 1000, 1),
+            "traced_bytes_samples": samples, "peak_traced_bytes": peak,
+            "polls_per_s": round(done / wall, 1)}
+
+
+# ======================
+# 複数ユーザー
+# ======================
+_PROCESS_RSS = """
+import resource, sys
+from approval_api import ApprovalClient
+ApprovalClient(api_url=sys.argv[1]).fetch(1)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def bench_users(quick=False, latency=0.02, rounds=3):
+    """
+    batch    : batch_url で全員分を1回で取得
+    pooled   : batch_url なし。1つのクライアントの接続プール（POOL_SIZE 本）で並行取得
+    separate : 1名ごとに ApprovalClient を作って取得（1名1プロセスで起動した場合の通信）
+    traced_bytes は取得後も保持しているメモリ（tracemalloc）、threads は残るスレッド数。
+    process_rss_kb は1名分を取得しただけのプロセスの最大常駐メモリで、1名1プロセスなら
+    これが N 倍かかる（Windows では計測しない）。
+    """
+    users = list(range(1, 11 if quick else 31))
+    results = {"users": len(users), "rounds": rounds}
+
+    def client_threads():  # スタブ側の接続処理スレッドは数えない
+        return sum("process_request" not in t.name for t in threading.enumerate())
+    # requests の読み込み・初回の確保を計測に含めないよう、先に1回取得しておく
+    stub = StubServer().start()
+    warm = ApprovalClient(api_url=stub.url)
+    warm.fetch_many([1, 2], stub.url)
+    warm.close()
+    stub.stop()
+    for name in ("batch", "pooled", "separate"):
+        stub = StubServer(latency=latency, counts=[(3, 0, 1), (4, 1, 1)]).start()
+        gc.collect()
+        threads_before = client_threads()
+        tracemalloc.start()
+        start = time.perf_counter()
+        if name == "separate":
+            clients = [ApprovalClient(api_url=stub.url) for _ in users]
+            with ThreadPoolExecutor(max_workers=len(users)) as pool:
+                for _ in range(rounds):
+                    got = dict(zip(users, pool.map(lambda c, uid: c.fetch(uid), clients, users)))
+        else:
+            clients = [ApprovalClient(api_url=stub.url)]
+            for _ in range(rounds):
+                got = clients[0].fetch_many(users, stub.url if name == "batch" else None)
+        wall = time.perf_counter() - start
+        gc.collect()
+        traced = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results[name] = {"requests": stub.requests, "connections": stub.connections,
+                         "threads": client_threads() - threads_before,
+                         "traced_bytes": traced,
+                         "received": sum(data is not None for data in got.values()),
+                         "round_ms": round(wall / rounds * 1000, 3)}
+        for client in clients:
+            client.close()
+        stub.stop()
+    if sys.platform != "win32":
+        stub = StubServer(counts=[(3, 0, 1)]).start()
+        out = subprocess.run([sys.executable, "-c", _PROCESS_RSS, stub.url], capture_output=True,
+                             text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        stub.stop()
+        results["process_rss_kb"] = int(out.stdout.split()[-1])
+    return results
+
+
+# ======================
+# 通知判定
+# ======================
+def _response(*ids, danger=()):
+    """id 付き明細のレスポンス（danger に含めた id は至急）"""
+    items = [{"id": i, "level": "danger" if i in danger else None} for i in ids]
+    return {"order_requests_count": len(ids), "danger_count": len(danger), "alert_count": 0,
+            "items": items}
+
+
+def _counts_only(data):
+    return {k: v for k, v in data.items() if k != "items"}
+
+
+def bench_notify(quick=False):
+    """
+    trace ごとに replay の表示回数（popups）と想定値（expected）を並べる。
+    間隔は interval 秒ごとの取得、min_interval はポップアップの最短間隔。
+    """
+    same_interval = [_response("a", "b"), _response("a", "c")]  # b を承認し、c が届いた
+    escalation = [_response("a", "b", "c"), _response("a", "b", "c", danger=("c",))]
+    burst = [_response(*"abcd"[:n]) for n in range(1, 5)]  # 10秒ごとに1件ずつ届く
+    quiet = [burst[-1]] * 3  # その後は変化なし
+    traces = {
+        # 承認と新着が同じ間隔内：件数は変わらないが id で新着を検出する
+        "approve_and_new_ids": (same_interval, {}, 2),
+        "approve_and_new_counts_only": ([_counts_only(d) for d in same_interval], {}, 1),
+        # 総数は同じまま至急に上がった
+        "danger_escalation": ([_counts_only(d) for d in escalation], {}, 2),
+        # 最短間隔内に続けて届いた分は1回にまとめる
+        "burst": (burst, {"interval": 10, "min_interval": 60}, 1),
+        # まとめた分は次に表示できる時刻（60秒後）に表示する
+        "suppressed_then_next_slot": (burst + quiet, {"interval": 10, "min_interval": 60}, 2),
+    }
+    results = {}
+    for name, (trace, options, expected) in traces.items():
+        popups = replay(trace, **options)
+        results[name] = {"responses": len(trace), "popups": popups, "expected": expected}
+    results["all_expected"] = all(r["popups"] == r["expected"] for r in results.values())
+    return results
+
+
+# ======================
+# サーキットブレーカー
+# ======================
+def bench_breaker(quick=False, interval=0.02):
+    """正常 → 全件 503 → 復旧 の順に一定間隔で取得し、区間ごとの上流リクエスト数を比べる"""
+    stub = StubServer(counts=[(3, 0, 1)]).start()
+    client = ApprovalClient(api_url=stub.url)
+    client.breaker = CircuitBreaker(reset_timeout=0.5, max_reset_timeout=2.0)
+    phases = (("healthy", 0.0, 1.0), ("outage", 1.0, 3.0 if quick else 10.0),
+              ("recovery", 0.0, 3.0))
+    results = {}
+    for name, error_rate, seconds in phases:
+        stub.error_rate = error_rate
+        sent_before, attempts = stub.requests, 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            client.fetch(2)
+            attempts += 1
+            time.sleep(interval)
+        sent = stub.requests - sent_before
+        results[name] = {"attempts": attempts, "upstream_requests": sent,
+                         "upstream_per_s": round(sent / seconds, 2),
+                         "breaker_at_end": client.breaker.state}
+    client.close()
+    stub.stop()
+    return results
+
+
+# ======================
+# 拠点リレー
+# ======================
+def bench_relay(quick=False, latency=0.2):
+    """
+    端末ごとに別の ApprovalClient（別の Session）で、同じユーザーをリレーへ同時に取得する。
+    上流への取得は TTL の間1回だけで、2巡目は各端末が ETag で 304 を受け取る。
+    """
+    terminals = 10 if quick else 30
+    stub = StubServer(latency=latency, counts=[(3, 0, 1)]).start()
+    relay = create_server("127.0.0.1", 0, ttl=60, upstream=stub.url)
+    threading.Thread(target=relay.serve_forever, daemon=True).start()
+    host, port = relay.server_address[:2]
+    clients = [ApprovalClient(api_url=f"http://{host}:{port}/api/order_request/approval_requests")
+               for _ in range(terminals)]
+    barrier = threading.Barrier(terminals)
+
+    def call(client):
+        barrier.wait()
+        return client.request(2)
+    results = {"terminals": terminals}
+    with ThreadPoolExecutor(max_workers=terminals) as pool:
+        for name in ("first", "second"):
+            got = list(pool.map(call, clients))
+            results[name] = {"received": sum(r.data is not None for r in got),
+                             "not_modified": sum(r.not_modified for r in got),
+                             "relay_upstream_requests": relay.cache.upstream_requests,
+                             "stub_requests": stub.requests}
+    for client in clients:
+        client.close()
+    relay.shutdown()
+    relay.server_close()
+    stub.stop()
+    return results
+
+
+# ======================
+# プッシュ受信
+# ======================
+def bench_push(quick=False, interval=60):
+    """publish から on_data までの時間（ポーリングなら平均 interval / 2 秒待つ）と、
+    受信待ちのまま stop() した時に呼び出し元が待たされる時間・停止後に値が渡されないか"""
+    import requests
+    rounds = 10 if quick else 50
+    results = {"polling_expected_ms": interval / 2 * 1000}
+    for mode in ("sse", "longpoll"):
+        stub = StubServer().start()
+        received = queue.Queue()
+        listener = PushListener(stub.push_url, 1, lambda data: received.put(time.perf_counter()),
+                                mode=mode, session=requests.Session())
+        listener.start()
+        # 接続前の publish は届かないため、1件届くまで送り直す
+        for n in range(50):
+            stub.publish({"order_requests_count": n, "danger_count": 0, "alert_count": 0})
+            try:
+                received.get(timeout=0.2)
+                break
+            except queue.Empty:
+                continue
+        latencies = []
+        for n in range(rounds):
+            time.sleep(0.01)
+            start = time.perf_counter()
+            stub.publish({"order_requests_count": 100 + n, "danger_count": 0, "alert_count": 0})
+            latencies.append(received.get(timeout=5) - start)
+
+        time.sleep(0.1)  # 次の変化を待っている状態で止める
+        start = time.perf_counter()
+        listener.stop()
+        stop_ms = (time.perf_counter() - start) * 1000
+        stub.publish({"order_requests_count": 999, "danger_count": 0, "alert_count": 0})
+        listener.thread.join(1.0)
+        results[mode] = dict(_ms(latencies), rounds=rounds, stop_ms=round(stop_ms, 3),
+                             delivered_after_stop=received.qsize(),
+                             thread_exited=not listener.thread.is_alive())
+        stub.stop()
+    return results
+
+
+# ======================
+# 在席状態
+# ======================
+def _workday(t):
+    """(無操作秒, ロック中) を返す。9〜12時・13〜18時は在席、昼は席を外し、終業後はロック"""
+    hour = t / 3600
+    if 9 <= hour < 12 or 13 <= hour < 18:
+        return 0.0, False
+    if 12 <= hour < 13:
+        return t - 12 * 3600, False
+    return 0.0, True
+
+
+def _simulate_presence(use_presence, interval=60, activity=_workday):
+    """main3.py と同じ手順（5秒ごとに在席確認 → 間隔の変更・停止・復帰時の即取得）を仮想時刻で回す"""
+    now = [0.0]
+    scheduler = PollScheduler(interval, clock=lambda: now[0], rand=lambda: 0.5)
+    stub = StubPresence()
+    monitor = PresenceMonitor(stub)
+    step = PRESENCE_INTERVAL / 1000
+    polls, next_poll, last_poll, paused = 0, 0.0, None, False
+    staleness = []  # 席に戻った時点で表示中の件数がどれだけ古いか（秒）
+    was_present = False
+    t = 0.0
+    while t < DAY:
+        now[0] = t
+        stub.idle, stub.is_locked = activity(t)
+        present = not stub.is_locked and stub.idle == 0
+        if use_presence:
+            previous = monitor.state
+            state, returned = monitor.poll()
+            if state != previous:
+                scheduler.slowdown = IDLE_FACTOR if state == IDLE else 1
+                paused = state == AWAY
+                if returned:
+                    next_poll = t
+        if not paused and t >= next_poll:
+            polls += 1
+            hours = t / 3600
+            data = {"order_requests_count": 3 + (hours > 9) + (hours > 15),
+                    "danger_count": 0, "alert_count": 0}
+            next_poll = t + scheduler.record(data)
+            last_poll = t
+        if present and not was_present and last_poll is not None:
+            staleness.append(round(t - last_poll, 1))
+        was_present = present
+        t += step
+    return {"polls_per_day": polls, "staleness_on_return_s": staleness}
+
+
+def bench_presence(quick=False):
+    """離席判定なし / ありで1日の取得回数を比べる（1台あたり。台数を掛ければ全体の削減数）"""
+    baseline = _simulate_presence(False)
+    aware = _simulate_presence(True)
+    return {"without_presence": baseline, "with_presence": aware,
+            "requests_saved_per_day": baseline["polls_per_day"] - aware["polls_per_day"]}
+
+
+# ======================
+# 設定の保存
+# ======================
+def bench_settings(quick=False):
+    from unittest import mock
+    result = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, SETTING_FILE)
+        original = dict(DEFAULT_SETTING, user_id=2)
+        write_settings(original, path)
+
+        # 一時ファイルへの書き込み後、置き換え前に止まった場合
+        with mock.patch("settings_store.os.replace", side_effect=OSError("中断")):
+            write_settings(dict(original, user_id=99), path)
+        result["interrupted_write_kept_original"] = load_settings(path)["user_id"] == 2
+
+        # 途中までしか書かれていないファイル（置き換えを使わない古い版・手作業の編集）
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(original)[:20])
+        loaded = load_settings(path)
+        result["truncated_loaded_defaults"] = loaded == DEFAULT_SETTING
+        result["truncated_moved_to_broken"] = os.path.exists(path + ".broken")
+
+        # Ctrl+ホイール相当：0.01 秒ごとに50回保存
+        writes = []
+        threads = set()
+        with mock.patch("settings_store.write_settings",
+                        side_effect=lambda data, p: writes.append(data["size"])):
+            for size in range(100, 150):
+                save_settings(dict(original, size=size), path, delay=0.2)
+                threads.update(t.name for t in threading.enumerate() if t.name == "settings-writer")
+                time.sleep(0.01)
+            time.sleep(0.5)
+        result["burst_saves"] = 50
+        result["burst_writes"] = writes
+        result["burst_writer_threads"] = len(threads)
+        result["writer_exited"] = not any(t.name == "settings-writer" for t in threading.enumerate())
+    return result
+
+
+# ======================
+# 設定の再読み込み
+# ======================
+def _write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def bench_reload(quick=False):
+    """headless.py を別プロセスで起動し、手作業の編集と同じように設定ファイルを書き換える"""
+    stub = StubServer(counts=[(3, 0, 1)]).start()
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "headless.py")
+    result = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, SETTING_FILE)
+        setting = dict(DEFAULT_SETTING, user_id=2, api_url=stub.url, refresh_interval=600)
+        _write_json(path, setting)
+        proc = subprocess.Popen([sys.executable, script, "--events", "update,reload"], cwd=tmp,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                text=True, encoding="utf-8")
+        events = queue.Queue()
+        threading.Thread(target=lambda: [events.put(json.loads(line)) for line in proc.stdout],
+                         daemon=True).start()
+
+        def wait_for(match, timeout=10):
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                try:
+                    event = events.get(timeout=deadline - time.monotonic())
+                except queue.Empty:
+                    break
+                if match(event):
+                    return event
+            return None
+
+        try:
+            first = wait_for(lambda e: e["event"] == "update")
+            time.sleep(0.05)  # 更新時刻が確実に変わるように
+            start = time.perf_counter()
+            _write_json(path, dict(setting, user_id=5))
+            reload = wait_for(lambda e: e["event"] == "reload")
+            polled = wait_for(lambda e: e["event"] == "update" and e["user"] == 5)
+            result["first_poll_user"] = first and first["user"]
+            result["reload_changed"] = reload and reload["changed"]
+            result["reload_to_next_poll_ms"] = (round((time.perf_counter() - start) * 1000, 1)
+                                                if polled else None)
+        finally:
+            proc.terminate()
+            proc.wait(10)
+
+        # 同じプロセスの保存（ドラッグ終了など）は読み直さず、外部の書き換えだけを返す
+        watcher = SettingsWatcher(path)
+        save_settings(dict(setting, x=10, y=20), path)
+        flush_settings()
+        result["own_write_reloaded"] = watcher.poll() is not None
+        time.sleep(0.05)
+        _write_json(path, dict(setting, x=30, y=40))
+        result["external_write_reloaded"] = watcher.poll() is not None
+
+        # エディタが書き込み途中のファイルは退避も既定値での上書きもせず、書き終わってから読む
+        time.sleep(0.05)
+        text = json.dumps(dict(setting, x=50, y=60))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text[:len(text) // 2])
+        partial = watcher.poll()
+        result["partial_write_reloaded"] = partial is not None
+        result["partial_write_kept_file"] = (os.path.exists(path)
+                                             and not os.path.exists(path + ".broken"))
+        time.sleep(0.05)
+        _write_json(path, dict(setting, x=50, y=60))
+        completed = watcher.poll()
+        result["completed_write_position"] = completed and [completed["x"], completed["y"]]
+    stub.stop()
+    result["watch_interval_ms"] = WATCH_INTERVAL
+    return result
+
+
+# ======================
+# コアループ
+# ======================
+def bench_core(quick=False, interval=60):
+    """main3.py と同じ構成（取得・設定監視・在席確認）をループに載せ、待機中の起床回数を数える"""
+    minutes = 1 if quick else 5
+    stub = StubServer(counts=[(3, 0, 1)]).start()
+    client = ApprovalClient(api_url=stub.url)
+    counters = get_metrics().counters
+    wakeups_before = counters.get("core_wakeups", 0)
+    posts = []  # TkBridge.post 相当（Tk を起こす回数）
+
+    core = CoreLoop().start()
+    scheduler = PollScheduler(interval / CORE_SPEED, min_interval=0.1)
+    poller = AsyncPoller(core, lambda: client.fetch(1), scheduler,
+                         lambda data: data and posts.append(data))
+    monitor = PresenceMonitor(StubPresence())
+    poller.start()
+    timers = [core.every(WATCH_INTERVAL / 1000 / CORE_SPEED, lambda: os.stat(__file__)),
+              core.every(PRESENCE_INTERVAL / 1000 / CORE_SPEED, monitor.poll)]
+    time.sleep(minutes * 60 / CORE_SPEED)
+    # スタブ側の接続スレッドは数えない
+    threads = sorted(t.name for t in threading.enumerate() if t.name.startswith("core-"))
+    wakeups = counters.get("core_wakeups", 0) - wakeups_before
+    for timer in timers:
+        timer.cancel()
+    poller.stop()
+    core.stop()
+    client.close()
+    stub.stop()
+    # 以前は Tk 側の after で結果確認・設定監視・在席確認を回していた（件数に変化がなくても起きる）
+    previous = 60000 / PREVIOUS_PUMP_INTERVAL + 60000 / WATCH_INTERVAL + 60000 / PRESENCE_INTERVAL
+    return {"minutes": minutes, "polls": stub.requests,
+            "core_wakeups_per_min": round(wakeups / minutes, 1),
+            "ui_wakeups_per_min": round(len(posts) / minutes, 1),
+            "previous_ui_wakeups_per_min": round(previous, 1),
+            "core_threads": threads, "ui_loop": _bench_ui_loop(quick)}
+
+
+def _ui_loop(seconds, work, posted, tick=0.01):
+    """Tk の mainloop 相当：tick ごとに起きて work(経過秒) と渡された処理を実行し、
+    予定時刻からの遅れ（画面が固まっていた時間）を返す"""
+    lateness = []
+    start = time.perf_counter()
+    due = start + tick
+    while due - start < seconds:
+        time.sleep(max(0.0, due - time.perf_counter()))
+        now = time.perf_counter()
+        lateness.append(now - due)
+        work(now - start)
+        while True:
+            try:
+                fn = posted.get_nowait()
+            except queue.Empty:
+                break
+            fn()
+        due = max(due, now) + tick  # 遅れた分は次の起床で計上し、予定を今に合わせ直す
+    return lateness
+
+
+def _bench_ui_loop(quick=False, latency=0.5, trigger_every=0.3):
+    """
+    応答に latency 秒かかるスタブへ、UI 側から trigger_every 秒ごとに即時取得を依頼する。
+    worker      : 現在の構成（コアループ → 通信スレッドで取得し、結果だけ UI へ渡す）
+    on_ui_thread: 以前の構成（UI スレッドで直接取得）
+    """
+    seconds = 3 if quick else 10
+    results = {"stub_latency_ms": latency * 1000, "seconds": seconds}
+    for name in ("worker", "on_ui_thread"):
+        stub = StubServer(latency=latency, counts=[(3, 0, 1), (4, 1, 1)]).start()
+        client = ApprovalClient(api_url=stub.url)
+        posted = queue.Queue()  # TkBridge.post 相当
+        received = []
+        triggers = [0]
+
+        def due(elapsed):
+            if elapsed < triggers[0] * trigger_every:
+                return False
+            triggers[0] += 1
+            return True
+        if name == "worker":
+            core = CoreLoop().start()
+            poller = AsyncPoller(core, lambda: client.fetch(2), PollScheduler(trigger_every),
+                                 lambda data: posted.put(lambda: received.append(data)))
+            poller.start()
+            lateness = _ui_loop(seconds, lambda t: due(t) and poller.trigger(), posted)
+            poller.stop()
+            core.stop()
+        else:
+            lateness = _ui_loop(seconds, lambda t: due(t) and received.append(client.fetch(2)),
+                                posted)
+        results[name] = dict(_ms(lateness), max_ms=round(max(lateness) * 1000, 3),
+                             ticks=len(lateness), results=len(received))
+        client.close()
+        stub.stop()
+    return results
+
+
+# ======================
+# 描画
+# ======================
+def bench_render(quick=False):
+    """Tk 上でのバッジ差し替え（キャッシュなし / あり）と、ポップアップの作成・数百回の再表示での
+    表示時間・ウィジェット数の推移（最初と最後の10%・1回目と最後）"""
+    if sys.platform != "win32" and not os.environ.get("DISPLAY"):
+        return {"skipped": "画面がありません（xvfb-run などで DISPLAY を設定してください）"}
+    import tkinter as tk
+    from PIL import ImageTk
+    from badge import BadgeRenderer
+    import main3
+
+    root = tk.Tk()
+    canvas = tk.Canvas(root, width=300, height=300)
+    canvas.pack()
+    renderer = BadgeRenderer(convert=ImageTk.PhotoImage)
+    canvas.create_image(0, 0, anchor="nw", image=renderer.render(120, "#546E7A", 0), tags="badge")
+    rounds = 20 if quick else 100
+
+    def draw(count, size):
+        start = time.perf_counter()
+        canvas.itemconfig("badge", image=renderer.render(size, "#FF5252", count))
+        root.update_idletasks()
+        return time.perf_counter() - start
+
+    uncached = [draw(i, 80 + i % 200) for i in range(1, rounds + 1)]
+    cached = [draw(i % 5, 120) for i in range(rounds)]
+
+    # 何百回表示しても作成時間・ウィジェット数が増えないこと（2回目以降は作り直さず再表示）
+    triggers = 200 if quick else 500
+    setting = {"user_id": 2}
+    shows = []
+    widgets = []
+    for n in range(triggers):
+        data = {"order_requests_count": 14 + n % 5, "danger_count": 8, "alert_count": 2}
+        start = time.perf_counter()
+        main3.show_popup(data, setting)
+        root.update()
+        shows.append(time.perf_counter() - start)
+        if n in (0, triggers - 1):
+            widgets.append(main3.popup_widget_count())
+        main3._popup["window"].withdraw()
+    # root を破棄すると数えられないため、数え終えてから破棄する
+    root.destroy()
+    main3.release_windows()
+    tenth = max(1, triggers // 10)
+    return {"badge_uncached": _ms(uncached), "badge_cached": _ms(cached),
+            "popup_triggers": triggers,
+            "popup_first_ms": round(shows[0] * 1000, 3),
+            "popup_reshow_first_10pct": _ms(shows[1:tenth + 1]),
+            "popup_reshow_last_10pct": _ms(shows[-tenth:]),
+            "popup_widgets_first": widgets[0], "popup_widgets_last": widgets[-1],
+            "popup_widgets_constant": widgets[0] == widgets[-1]}
+
+
+# ======================
+# Tk の呼び出し回数
+# ======================
+class _CountingTcl:
+    """Tcl インタープリタの代わりに、発行されたコマンドを数えるだけのもの（画面なしで計測できる）"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def call(self, *args):
+        self.calls += 1
+        return "0"
+
+    def getint(self, value):
+        return int(value)
+
+    def getdouble(self, value):
+        return float(value)
+
+    def splitlist(self, value):
+        return ()
+
+
+def _badge_redraw(canvas, root):
+    """以前の draw_badge：毎回すべて消して影・本体・文字の7個を作り直す"""
+    def draw(count, color, size):
+        canvas.delete("all")
+        r = int(size / 2.2)
+        c = size // 2
+        for i, shadow in enumerate(("#1a1a1a", "#121212", "#0a0a0a")):
+            offset = 8 - i * 2
+            canvas.create_oval(c - r - offset, c - r - offset, c + r + offset, c + r + offset,
+                               fill=shadow, outline="", width=0)
+        canvas.create_oval(c - r, c - r, c + r, c + r, fill=color, outline="", width=0)
+        canvas.create_text(c, c - int(size * 0.05), text=str(count), fill="white", anchor="center",
+                           font=("Segoe UI", max(10, int(size / 2.8)), "bold"))
+        canvas.create_text(c, c + int(size * 0.18), text="承認待ち", fill="#FFFFFF", anchor="center",
+                           font=("Yu Gothic UI", max(8, int(size / 9))))
+    return draw
+
+
+def _badge_items(canvas, root):
+    """アイテムを1度だけ作り、変化した座標・色・文字だけを更新する版"""
+    drawn = {"count": None, "color": None, "size": None}
+
+    def draw(count, color, size):
+        if drawn["size"] is None:
+            for i, shadow in enumerate(("#1a1a1a", "#121212", "#0a0a0a")):
+                canvas.create_oval(0, 0, 0, 0, fill=shadow, outline="", width=0, tags=f"shadow{i}")
+            canvas.create_oval(0, 0, 0, 0, outline="", width=0, tags="body")
+            canvas.create_text(0, 0, fill="white", anchor="center", tags="count")
+            canvas.create_text(0, 0, text="承認待ち", fill="#FFFFFF", anchor="center", tags="label")
+        if drawn["size"] != size:
+            r = int(size / 2.2)
+            c = size // 2
+            for i in range(3):
+                offset = 8 - i * 2
+                canvas.coords(f"shadow{i}", c - r - offset, c - r - offset,
+                              c + r + offset, c + r + offset)
+            canvas.coords("body", c - r, c - r, c + r, c + r)
+            canvas.coords("count", c, c - int(size * 0.05))
+            canvas.itemconfig("count", font=("Segoe UI", max(10, int(size / 2.8)), "bold"))
+            canvas.coords("label", c, c + int(size * 0.18))
+            canvas.itemconfig("label", font=("Yu Gothic UI", max(8, int(size / 9))))
+            drawn["size"] = size
+        if drawn["color"] != color:
+            canvas.itemconfig("body", fill=color)
+            drawn["color"] = color
+        if drawn["count"] != count:
+            canvas.itemconfig("count", text=str(count))
+            drawn["count"] = count
+    return draw
+
+
+def _badge_image(canvas, root):
+    """現在の draw_badge：Pillow で描いた画像1枚を (サイズ, 色, 件数) ごとにキャッシュして差し替える"""
+    import tkinter as tk
+    from badge import BadgeRenderer
+
+    def convert(image):
+        # ImageTk.PhotoImage と同じく、画像の作成と画素の転送で2回
+        photo = tk.PhotoImage(master=root, width=image.width, height=image.height)
+        root.tk.call("PyImagingPhoto", str(photo), id(image))
+        return photo
+    renderer = BadgeRenderer(convert=convert)
+    drawn = {"key": None}
+
+    def draw(count, color, size):
+        key = (size, color, count)
+        if drawn["key"] == key:
+            return
+        image = renderer.render(size, color, count)
+        if drawn["key"] is None:
+            canvas.create_image(0, 0, anchor="nw", image=image, tags="badge")
+        else:
+            canvas.itemconfig("badge", image=image)
+        drawn["key"] = key
+    return draw
+
+
+def bench_tk_calls(quick=False):
+    """
+    実際の tkinter.Canvas / Tk のメソッドを、Tcl コマンドを数えるだけのインタープリタに向けて呼ぶ。
+    per_update   : 件数だけが変わった時、unchanged : 同じ状態で呼ばれた時
+    resize_up    : Ctrl+ホイールで 10px ずつ大きくする1段階（resize() の寸法変更・位置保存を含む）
+    resize_back  : 同じサイズを戻る1段階（画像版はキャッシュに当たる）
+    """
+    import tkinter as tk
+    results = {}
+    for name, make in (("redraw", _badge_redraw), ("items", _badge_items), ("image", _badge_image)):
+        root = tk.Tcl()
+        root.tk = counter = _CountingTcl()
+        canvas = tk.Canvas(root, width=120, height=120)
+        draw = make(canvas, root)
+        draw("--", "#546E7A", 120)
+
+        def calls(fn, *args):
+            before = counter.calls
+            fn(*args)
+            return counter.calls - before
+
+        def step(size):
+            canvas.config(width=size, height=size)
+            draw(10, "#FF5252", size)
+            root.geometry(f"{size}x{size}+{root.winfo_x()}+{root.winfo_y()}")
+            root.winfo_x(), root.winfo_y()  # remember_geometry
+        update = [calls(draw, n, "#FF5252", 120) for n in range(1, 11)]
+        unchanged = calls(draw, 10, "#FF5252", 120)
+        up = [calls(step, size) for size in range(130, 230, 10)]
+        back = [calls(step, size) for size in range(210, 110, -10)]
+        results[name] = {"per_update": statistics.mean(update), "unchanged": unchanged,
+                         "resize_up": statistics.mean(up), "resize_back": statistics.mean(back)}
+    return results
+
+
+# ======================
+# ログ
+# ======================
+def bench_log(quick=False):
+    """
+    queued : 実際の構成（StructuredQueueHandler → 書き出しスレッドで JSON 化・ファイル出力）
+    direct : 呼び出したスレッドで JSON 化・ファイル出力まで行う場合
+    info は extra 付きの通常のログ、exception は例外のトレースバック付き
+    """
+    rounds = 500 if quick else 5000
+    results = {"rounds": rounds}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("queued", "direct"):
+            path = os.path.join(tmp, f"{name}.log")
+            file_handler = logging.handlers.RotatingFileHandler(path, encoding="utf-8")
+            file_handler.setFormatter(JsonFormatter())
+            log = logging.getLogger(f"bench.{name}")
+            log.propagate = False
+            log.setLevel(logging.INFO)
+            listener = None
+            if name == "queued":
+                log_queue = queue.SimpleQueue()
+                log.addHandler(StructuredQueueHandler(log_queue))
+                listener = logging.handlers.QueueListener(log_queue, file_handler)
+                listener.start()
+            else:
+                log.addHandler(file_handler)
+
+            def timed(call):
+                times = []
+                for i in range(rounds):
+                    start = time.perf_counter()
+                    call(i)
+                    times.append(time.perf_counter() - start)
+                return _ms(times)
+
+            def exception(i):
+                try:
+                    raise ValueError(i)
+                except ValueError:
+                    log.exception("取得処理エラー")
+            info = timed(lambda i: log.info("取得", extra={"user_id": i, "status": 200,
+                                                           "elapsed": 0.012}))
+            exc = timed(exception)
+            if listener is not None:
+                listener.stop()
+            log.handlers.clear()
+            file_handler.close()
+            with open(path, encoding="utf-8") as f:
+                last = json.loads(f.readlines()[-1])
+            results[name] = {"info": info, "exception": exc,
+                             "exc_field": "Traceback" in last.get("exc", ""),
+                             "msg_has_traceback": "Traceback" in last["msg"]}
+    return results
+
+
+BENCHES = {"fetch": bench_fetch, "scheduler": bench_scheduler,
+           "memory": bench_memory, "users": bench_users,
+           "notify": bench_notify, "breaker": bench_breaker, "relay": bench_relay,
+           "push": bench_push, "presence": bench_presence, "settings": bench_settings,
+           "reload": bench_reload, "core": bench_core, "render": bench_render,
+           "tk_calls": bench_tk_calls, "log": bench_log}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="承認通知 ベンチマーク")
+    parser.add_argument("--only", default=",".join(SECTIONS), help="実行する項目（カンマ区切り）")
+    parser.add_argument("--quick", action="store_true", help="回数を減らして短時間で実行")
+    parser.add_argument("--out", help="結果の JSON を書き出すファイル（省略時は標準出力）")
+    args = parser.parse_args(argv)
+
+    sections = [s for s in args.only.split(",") if s]
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"不明な項目: {','.join(sorted(unknown))}")
+
+    report = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+              "platform": platform.platform(), "quick": args.quick, "results": {}}
+    for name in sections:
+        start = time.perf_counter()
+        try:
+            report["results"][name] = BENCHES[name](args.quick)
+        except Exception as e:
+            # 1項目の失敗で他の項目の結果まで失わないよう、エラーとして記録して続ける
+            report["results"][name] = {"error": f"{type(e).__name__}: {e}"}
+            print(f"[ERROR] {name} 失敗: {e}", file=sys.stderr)
+        report["results"][name]["seconds"] = round(time.perf_counter() - start, 2)
+        print(f"[INFO] {name} 完了", file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
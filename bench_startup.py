@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+起動時間ベンチマーク
+main3.py（またはビルド済みEXE）を --measure-startup 付きで繰り返し起動し、
+初回描画までの時間（プロセス内計測）と起動〜終了の総時間を表示する。
+
+  python bench_startup.py               … python main3.py を計測
+  python bench_startup.py dist\\main3.exe … EXE を計測（コンソール版ビルドで使用）
+"""
+
+import statistics
+import subprocess
+import sys
+import time
+
+RUNS = 10
+
+
+def measure(cmd):
+    start = time.perf_counter()
+    out = subprocess.run(cmd + ["--measure-startup"], capture_output=True, text=True).stdout
+    wall = (time.perf_counter() - start) * 1000
+    paint = None
+    for line in out.splitlines():
+        if line.startswith("first_paint_ms="):
+            paint = float(line.split("=", 1)[1])
+    return paint, wall
+
+
+def main():
+    cmd = sys.argv[1:] or [sys.executable, "main3.py"]
+    paints, walls = [], []
+    for _ in range(RUNS):
+        paint, wall = measure(cmd)
+        if paint is not None:
+            paints.append(paint)
+        walls.append(wall)
+
+    if paints:
+        print(f"first_paint_ms  median={statistics.median(paints):.1f} "
+              f"min={min(paints):.1f} max={max(paints):.1f}")
+    print(f"process_wall_ms median={statistics.median(walls):.1f} "
+          f"min={min(walls):.1f} max={max(walls):.1f}")
+
+
+if __name__ == "__main__":
+    main()
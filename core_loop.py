@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+GUI 以外の処理を動かす asyncio ループ
+・取得のスケジュール・設定ファイルの監視・在席判定・計測値の HTTP 公開を専用スレッド1本のループで行う
+  （待ち時間は asyncio のタイマーで管理し、一定間隔で様子を見に行く処理は置かない）
+・requests による通信は非同期にできないため、ループが持つ通信用スレッド（既定1本）で実行
+・Tk へは TkBridge、トレイ・IPC スレッドからの指示は Inbox → TkBridge の順で渡す
+  （Tk 側は after でキューを見に行かず、仮想イベントで起こされた時だけ処理する）
+
+  Tk スレッド  ── call / trigger ──▶  コアループ  ── offload ──▶  通信スレッド
+      ▲                                  │
+      └──────── TkBridge.post ◀──────────┘
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import get_metrics
+
+IO_WORKERS = 2  # 通信用スレッドの上限（通常は1本。取得中に明細を開いた時だけ2本目を使う）
+
+log = logging.getLogger(__name__)
+
+
+# ======================
+# ループ本体
+# ======================
+class CoreLoop:
+    """
+    start() でループ用スレッドを起動する。以降はどのスレッドからでも
+    call(fn) / submit(coro) / every(秒, fn) / offload(fn, then) でループへ処理を渡せる。
+    """
+
+    def __init__(self, io_workers=IO_WORKERS):
+        self.loop = None
+        self.thread = None
+        self._executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="core-io")
+
+    def start(self):
+        if self.loop is not None:
+            return self
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(self._executor)
+        self.thread = threading.Thread(target=self._run, name="core-loop", daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def stop(self):
+        """残っている処理を取り消してループを止める（ベンチマーク等の後始末用）"""
+        loop, self.loop = self.loop, None
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop)
+            self.thread.join(timeout=2)
+        self._executor.shutdown(wait=False)
+
+    async def _shutdown(self):
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        asyncio.get_running_loop().stop()
+
+    def call(self, fn, *args):
+        """fn(*args) をループ上で実行する"""
+        self.loop.call_soon_threadsafe(fn, *args)
+
+    def submit(self, coro):
+        """コルーチンをループ上で実行し、concurrent.futures.Future を返す（cancel() で中止）"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def every(self, seconds, fn):
+        """fn をループ上で seconds 秒ごとに呼ぶ。戻り値の cancel() で止める"""
+        return self.submit(self._repeat(seconds, fn))
+
+    async def _repeat(self, seconds, fn):
+        while True:
+            await asyncio.sleep(seconds)
+            get_metrics().incr("core_wakeups")
+            try:
+                fn()
+            except Exception:
+                log.exception("定期処理エラー", extra={"task": getattr(fn, "__name__", str(fn))})
+
+    def blocking(self, fn, *args):
+        """ループ上のコルーチンから await する：fn(*args) を通信スレッドで実行"""
+        return self.loop.run_in_executor(None, fn, *args)
+
+    def offload(self, fn, then=None):
+        """fn() を通信スレッドで実行し、結果（例外時は None）を then(result) に渡す
+        then は通信スレッド上で呼ばれる（Tk へ渡す場合は TkBridge.post を使う）"""
+        def done(future):
+            try:
+                result = future.result()
+            except Exception:
+                log.exception("バックグラウンド処理エラー")
+                result = None
+            if then is not None:
+                then(result)
+        self._executor.submit(fn).add_done_callback(done)
+
+
+_core = CoreLoop()
+
+
+def get_core():
+    """プロセス内で共有するループを返す（初回に起動）"""
+    return _core.start()
+
+
+# ======================
+# 定期取得
+# ======================
+class AsyncPoller:
+    """
+    fetch()     : 取得関数（成功時 dict、失敗時 None）。通信スレッドで実行
+    scheduler   : PollScheduler（次回取得までの待ち時間を決める）
+    on_result   : 取得のたびに on_result(data) をループ上で呼ぶ（失敗時は None）
+    should_fetch: False を返す間は取得を省略（プッシュ接続中など）
+    trigger / pause / resume / stop はどのスレッドから呼んでもよい。
+    """
+
+    def __init__(self, core, fetch, scheduler, on_result, should_fetch=None):
+        self.core = core
+        self.fetch = fetch
+        self.scheduler = scheduler
+        self.on_result = on_result
+        self.should_fetch = should_fetch or (lambda: True)
+        self.paused = None  # 停止中の理由（None なら動作中）
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        self._task = self.core.submit(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def trigger(self):
+        """待ち時間を打ち切って直ちに取得する"""
+        self.core.call(self._wake.set)
+
+    def pause(self, reason):
+        """resume されるまで取得を止める（離席中など）。停止中はタイマーも使わない"""
+        self.paused = reason
+
+    def resume(self):
+        """停止を解除し、待たずに取得する"""
+        if self.paused is not None:
+            self.paused = None
+            self.trigger()
+
+    async def _run(self):
+        while True:
+            if self.paused is not None:
+                await self._wake.wait()
+                self._wake.clear()
+                continue
+            get_metrics().incr("core_wakeups")
+            if self.should_fetch():
+                try:
+                    data = await self.core.blocking(self.fetch)
+                except Exception:
+                    log.exception("取得処理エラー")
+                    data = None
+                self.on_result(data)
+                delay = self.scheduler.record(data)
+            else:
+                delay = self.scheduler.skip("プッシュ接続中")
+            try:
+                await asyncio.wait_for(self._wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+
+# ======================
+# Tk への受け渡し
+# ======================
+class TkBridge:
+    """
+    post(fn, *args) はどのスレッドから呼んでもよく、fn(*args) を Tk スレッドで実行する。
+    キューに積んで仮想イベントを発生させ、Tk スレッドは起こされた時にまとめて処理する。
+    mainloop 開始前に積まれた分は start() でまとめて処理する。
+    """
+
+    EVENT = "<<CoreEvent>>"
+
+    def __init__(self, root):
+        self.root = root
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._signaled = False  # 仮想イベントを送って、まだ処理されていない
+        root.bind(self.EVENT, lambda e: self._drain())
+
+    def start(self):
+        """Tk スレッドで mainloop の直前に呼ぶ"""
+        self.root.after_idle(self._drain)
+
+    def post(self, fn, *args):
+        self._queue.put((fn, args))
+        with self._lock:
+            if self._signaled:
+                return  # 処理待ちのイベントがあれば、そのついでに処理される
+            self._signaled = True
+        try:
+            self.root.event_generate(self.EVENT, when="tail")
+        except (RuntimeError, tk.TclError):
+            # mainloop 開始前・終了後（開始時の start() で処理される）
+            with self._lock:
+                self._signaled = False
+
+    def _drain(self):
+        with self._lock:
+            self._signaled = False
+        get_metrics().incr("ui_wakeups")
+        while True:
+            try:
+                fn, args = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                fn(*args)
+            except Exception:
+                log.exception("Tk 側の処理エラー", extra={"task": getattr(fn, "__name__", str(fn))})
+
+
+# ======================
+# 他スレッドからの指示
+# ======================
+class Inbox:
+    """
+    トレイ・IPC スレッドからの指示の受け口。put() された指示は connect(sink) された
+    受け取り先へ渡し、受け取り先がない間（監視ループの起動前・再起動中）は溜めておく。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self._sink = None
+
+    def put(self, item):
+        with self._lock:
+            if self._sink is None:
+                self._pending.append(item)
+                return
+            sink = self._sink
+        sink(item)
+
+    def connect(self, sink):
+        with self._lock:
+            self._sink = sink
+            pending, self._pending = self._pending, []
+        for item in pending:
+            sink(item)
+
+    def disconnect(self):
+        with self._lock:
+            self._sink = None
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+最後に取得できた承認件数の保存・読み込み
+・起動直後やオフライン時に前回値を即座に表示するため
+・approval-notify-setting.json と同じフォルダに保存
+"""
+
+import json
+import logging
+import os
+import time
+
+CACHE_FILE = "approval-notify-cache.json"
+
+log = logging.getLogger(__name__)
+
+
+def load_counts(user_id, path=CACHE_FILE):
+    """(data, 取得時刻) を返す。別ユーザーの値や読み込み失敗時は (None, None)"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        if cache.get("user_id") != user_id:
+            return None, None
+        return cache["data"], cache["fetched_at"]
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+
+def save_counts(user_id, data, path=CACHE_FILE):
+    """一時ファイルに書いてから置き換える（書き込み途中で壊れないように）"""
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"user_id": user_id, "data": data, "fetched_at": time.time()},
+                      f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        log.warning("件数キャッシュ保存エラー: %s", e)
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+承認待ち明細の一覧
+・明細はページ単位で必要になった時だけ取得し、(ユーザー, 件数レスポンスの版) ごとに保持
+  （件数に変化がない間は開き直しても再取得しない。版が変わったら古い版は捨てる）
+・一覧は Canvas 上に見えている行の分だけ描画し、スクロールで行を使い回す
+  （数百件でも作成する図形は画面に収まる行数分のみ）
+・取得は offload（main3 ではコアループの通信スレッド）で行い、結果は Tk スレッドで受け取る
+  （取得中も after で結果を確認しに行かない）
+"""
+
+import logging
+import threading
+import time
+import tkinter as tk
+
+PER_PAGE = 50
+ROW_HEIGHT = 44
+LEVEL_COLORS = {"danger": "#FF5252", "alert": "#FF9800"}
+NORMAL_COLOR = "#546E7A"
+
+log = logging.getLogger(__name__)
+
+
+# ======================
+# ページキャッシュ
+# ======================
+class PageCache:
+    """
+    fetch_page(user_id, page, per_page) は {"items": [...], "total": N} か None を返す関数。
+    get は保持済みのページのみ返し、load は取得して保持する（取得スレッドから呼ぶ）。
+    """
+
+    def __init__(self, fetch_page=None, per_page=PER_PAGE):
+        self.fetch_page = fetch_page
+        self.per_page = per_page
+        self.hits = 0
+        self.misses = 0
+        self._pages = {}   # (user_id, version) -> {page: items}
+        self._totals = {}  # (user_id, version) -> 総件数
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version, page):
+        with self._lock:
+            items = self._pages.get((user_id, version), {}).get(page)
+            if items is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return items
+
+    def total(self, user_id, version):
+        with self._lock:
+            return self._totals.get((user_id, version))
+
+    def load(self, user_id, version, page):
+        """1ページ取得して保持し、items を返す。失敗時は None"""
+        body = self.fetch_page(user_id, page, self.per_page)
+        if not isinstance(body, dict) or not isinstance(body.get("items"), list):
+            return None
+        key = (user_id, version)
+        with self._lock:
+            # 同じユーザーの古い版は不要になるため破棄
+            for old in [k for k in self._pages if k[0] == user_id and k != key]:
+                del self._pages[old]
+                self._totals.pop(old, None)
+            self._pages.setdefault(key, {})[page] = body["items"]
+            if "total" in body:
+                self._totals[key] = body["total"]
+        return body["items"]
+
+
+# ======================
+# 一覧ウィンドウ
+# ======================
+class DetailView:
+    """
+    見えている行だけを描画する明細一覧（Toplevel は使い回す）
+    offload(fn, done) は fn() を別スレッドで実行し、結果を Tk スレッドで done(result) に渡す関数。
+    """
+
+    def __init__(self, master, cache, offload, on_open_page=None):
+        self.cache = cache
+        self.offload = offload
+        self.user_id = None
+        self.version = None
+        self.total = 0
+        self.first_row_ms = None
+        self._opened = None
+        self._slots = []
+        self._inflight = set()
+        self._failed = set()  # 取得に失敗したページ（開き直すまで再取得しない）
+
+        win = self.window = tk.Toplevel(master)
+        win.withdraw()
+        win.title("承認待ち一覧")
+        win.geometry("640x520")
+        win.attributes("-topmost", True)
+        win.configure(bg="white")
+        win.protocol("WM_DELETE_WINDOW", win.withdraw)
+
+        self.header = tk.Label(win, font=("Meiryo", 16, "bold"), bg="white", anchor="w", padx=16)
+        self.header.pack(fill="x", pady=(12, 4))
+
+        body = tk.Frame(win, bg="white")
+        body.pack(expand=True, fill="both", padx=12)
+        self.scrollbar = tk.Scrollbar(body, command=self._yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas = tk.Canvas(body, bg="white", highlightthickness=0,
+                                yscrollincrement=ROW_HEIGHT, yscrollcommand=self.scrollbar.set)
+        self.canvas.pack(side="left", expand=True, fill="both")
+        self.canvas.bind("<Configure>", lambda e: self._refresh())
+        self.canvas.bind("<MouseWheel>", self._wheel)
+        self.canvas.bind("<Button-4>", lambda e: self._scroll(-3))  # X11 のホイール
+        self.canvas.bind("<Button-5>", lambda e: self._scroll(3))
+
+        footer = tk.Frame(win, bg="white")
+        footer.pack(fill="x", pady=8, padx=12)
+        self.status = tk.Label(footer, font=("Meiryo", 10), bg="white", fg="#777777")
+        self.status.pack(side="left")
+        tk.Button(footer, text="閉じる", command=win.withdraw,
+                  width=10, font=("Meiryo", 11)).pack(side="right")
+        if on_open_page:
+            tk.Button(footer, text="承認ページを開く", command=on_open_page, width=16,
+                      font=("Meiryo", 11), bg="#0078D7", fg="white").pack(side="right", padx=8)
+
+    # ----------------------------------------
+    # 表示
+    # ----------------------------------------
+    def show(self, user_id, version, total):
+        """ユーザー・版・総件数（件数レスポンスの値）を指定して表示"""
+        if (user_id, version) != (self.user_id, self.version):
+            self.canvas.yview_moveto(0)
+        self.user_id, self.version = user_id, version
+        self.total = self.cache.total(user_id, version) or total
+        self.first_row_ms = None
+        self._failed.clear()
+        self._opened = time.perf_counter()
+        self.header.config(text=f"承認待ち {self.total} 件")
+        self._update_region()
+        self.window.deiconify()
+        self.window.lift()
+        self._refresh()
+
+    def _update_region(self):
+        self.canvas.config(scrollregion=(0, 0, 1, max(1, self.total) * ROW_HEIGHT))
+
+    def _yview(self, *args):
+        self.canvas.yview(*args)
+        self._refresh()
+
+    def _scroll(self, units):
+        self.canvas.yview_scroll(units, "units")
+        self._refresh()
+
+    def _wheel(self, e):
+        self._scroll(-1 if e.delta > 0 else 1)
+
+    def _slot(self, index):
+        """行の図形（背景・目印・件名・補足）を必要な数だけ作り、以後は使い回す"""
+        while len(self._slots) <= index:
+            c = self.canvas
+            self._slots.append({
+                "bg": c.create_rectangle(0, 0, 0, 0, outline="", fill="white"),
+                "mark": c.create_rectangle(0, 0, 0, 0, outline="", fill=NORMAL_COLOR),
+                "title": c.create_text(0, 0, anchor="nw", font=("Meiryo", 12)),
+                "meta": c.create_text(0, 0, anchor="nw", font=("Meiryo", 9), fill="#777777"),
+            })
+        return self._slots[index]
+
+    def _refresh(self):
+        """見えている範囲の行だけを配置し直す"""
+        c = self.canvas
+        width = c.winfo_width()
+        first = max(0, int(c.canvasy(0) // ROW_HEIGHT))
+        visible = c.winfo_height() // ROW_HEIGHT + 2
+        shown = 0
+        for k in range(max(visible, len(self._slots))):
+            slot = self._slot(k) if k < visible else self._slots[k]
+            index = first + k
+            if k >= visible or index >= self.total:
+                for item in slot.values():
+                    c.itemconfig(item, state="hidden")
+                continue
+            y = index * ROW_HEIGHT
+            item = self._item(index)
+            c.coords(slot["bg"], 0, y, width, y + ROW_HEIGHT - 1)
+            c.itemconfig(slot["bg"], state="normal", fill="#F5F5F5" if index % 2 else "white")
+            c.coords(slot["mark"], 0, y + 6, 5, y + ROW_HEIGHT - 7)
+            c.coords(slot["title"], 14, y + 4)
+            c.coords(slot["meta"], 14, y + 25)
+            if item is None:
+                failed = (self.user_id, self.version, index // self.cache.per_page) in self._failed
+                c.itemconfig(slot["mark"], state="hidden")
+                c.itemconfig(slot["title"], state="normal", fill="#999999",
+                             text="取得できませんでした" if failed else "読み込み中…")
+                c.itemconfig(slot["meta"], state="hidden")
+                continue
+            shown += 1
+            c.itemconfig(slot["mark"], state="normal",
+                         fill=LEVEL_COLORS.get(item.get("level"), NORMAL_COLOR))
+            c.itemconfig(slot["title"], state="normal", fill="#222222",
+                         text=item.get("title") or f"申請 {item.get('id', '')}")
+            meta = " / ".join(str(item[k]) for k in ("requester", "created_at") if item.get(k))
+            c.itemconfig(slot["meta"], state="normal", text=meta)
+
+        if shown and self.first_row_ms is None:
+            self.first_row_ms = (time.perf_counter() - self._opened) * 1000
+            log.info("明細一覧 初回表示", extra={"first_row_ms": round(self.first_row_ms, 1),
+                                               "total": self.total})
+        self._update_status()
+
+    def _update_status(self):
+        text = f"{self.total} 件"
+        if self.first_row_ms is not None:
+            text += f"　初回表示 {self.first_row_ms:.0f}ms"
+        if self._inflight:
+            text += "　読み込み中…"
+        self.status.config(text=text)
+
+    # ----------------------------------------
+    # 取得
+    # ----------------------------------------
+    def _item(self, index):
+        page, offset = divmod(index, self.cache.per_page)
+        items = self.cache.get(self.user_id, self.version, page)
+        if items is None:
+            self._request(page)
+            return None
+        return items[offset] if offset < len(items) else None
+
+    def _request(self, page):
+        key = (self.user_id, self.version, page)
+        if key in self._inflight or key in self._failed:
+            return
+        self._inflight.add(key)
+        self.offload(lambda: self._load(key), lambda ok: self._loaded(key, ok))
+
+    def _load(self, key):
+        """取得スレッド：結果は Tk スレッドの _loaded で反映する"""
+        try:
+            return self.cache.load(*key) is not None
+        except Exception:
+            log.exception("明細取得エラー", extra={"page": key[2]})
+            return False
+
+    def _loaded(self, key, ok):
+        self._inflight.discard(key)
+        if not ok:
+            self._failed.add(key)
+        total = self.cache.total(self.user_id, self.version)
+        if total is not None and total != self.total:
+            self.total = total
+            self.header.config(text=f"承認待ち {self.total} 件")
+            self._update_region()
+        self._refresh()
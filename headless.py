@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+承認件数の監視（GUIなし）
+・画面・Tk・タスクトレイのない環境（踏み台サーバー・CI）で main3.py と同じ
+  取得・スケジュール（PollScheduler）・通知判定（NotificationEngine）を動かす
+・イベントは1行1件の JSON で標準出力・Webhook・ソケットへ送る
+・--users で多数のユーザーを個別に監視でき、GUIなしで負荷試験にも使える
+・設定ファイルの変更は再起動なしで反映する（コマンドラインで指定した項目はそちらを優先）
+
+  python headless.py --once                       … 1回だけ取得して終了
+  python headless.py --users 1-1000 --duration 600 --workers 32
+  main3.exe --headless --webhook http://host/hook --events notify,error
+
+終了コード
+  0 : 正常終了（--once では承認待ちなし）
+  1 : --once で承認待ちあり
+  2 : 引数エラー
+  3 : API取得失敗（--once、または --max-failures 回連続で失敗）
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import os
+import queue
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app_log import setup_logging
+from approval_api import API_URL, ApprovalClient, aggregate_counts
+from metrics import get_metrics
+from notify_engine import NotificationEngine
+from scheduler import PollScheduler
+from settings_store import DEFAULT_SETTING, SETTING_FILE, WATCH_INTERVAL, SettingsWatcher, load_settings
+
+EXIT_OK = 0
+EXIT_PENDING = 1
+EXIT_USAGE = 2  # argparse の引数エラーと同じ値
+EXIT_API_ERROR = 3
+
+EVENT_TYPES = ("start", "update", "notify", "error", "reload", "summary")
+
+log = logging.getLogger(__name__)
+
+
+# ======================
+# イベント出力先
+# ======================
+class StdoutSink:
+    def send(self, line):
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+    def close(self):
+        pass
+
+
+class WebhookSink:
+    """1イベントごとに JSON を POST する"""
+
+    def __init__(self, url, session, timeout=10):
+        self.url = url
+        self.session = session
+        self.timeout = timeout
+
+    def send(self, line):
+        try:
+            self.session.post(self.url, data=line.encode("utf-8"), timeout=self.timeout,
+                              headers={"Content-Type": "application/json; charset=utf-8"})
+        except Exception as e:
+            log.warning("Webhook送信エラー: %s", e, extra={"url": self.url})
+
+    def close(self):
+        pass
+
+
+class SocketSink:
+    """host:port（TCP）または unix:/path へ JSON 行を送る。切断時は次の送信で再接続"""
+
+    def __init__(self, address):
+        self.address = address
+        self._sock = None
+
+    def _connect(self):
+        if self.address.startswith("unix:"):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.address[5:])
+        else:
+            host, _, port = self.address.rpartition(":")
+            sock = socket.create_connection((host or "127.0.0.1", int(port)), timeout=10)
+        return sock
+
+    def send(self, line):
+        try:
+            if self._sock is None:
+                self._sock = self._connect()
+            self._sock.sendall((line + "\n").encode("utf-8"))
+        except OSError as e:
+            log.warning("ソケット送信エラー: %s", e, extra={"address": self.address})
+            self.close()
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+class EventEmitter:
+    """イベントを JSON 行にして出力先へ渡す（送信は専用スレッドで行い、取得を待たせない）"""
+
+    def __init__(self, sinks, events=EVENT_TYPES):
+        self.sinks = sinks
+        self.events = set(events)
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def emit(self, event, **fields):
+        if event not in self.events:
+            return
+        entry = {"event": event, "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        entry.update(fields)
+        self._queue.put(json.dumps(entry, ensure_ascii=False, default=str))
+
+    def close(self):
+        """残りのイベントを送り終えてから出力先を閉じる"""
+        self._queue.put(None)
+        self._thread.join()
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception:
+                log.exception("出力先の終了エラー", extra={"sink": type(sink).__name__})
+
+    def _run(self):
+        while True:
+            line = self._queue.get()
+            if line is None:
+                return
+            for sink in self.sinks:
+                # 1つの出力先の失敗で送信スレッドが止まり、他の出力先まで届かなくならないように
+                try:
+                    sink.send(line)
+                except Exception:
+                    log.exception("イベント送信エラー", extra={"sink": type(sink).__name__})
+
+
+# ======================
+# 監視対象
+# ======================
+class Watch:
+    """
+    監視単位。user_ids が1名ならそのユーザー、複数なら main3.py と同じく合算して判定する。
+    取得・次回時刻の決定・通知判定は GUI 版と同じ部品を使う。
+    """
+
+    def __init__(self, client, user_ids, interval, popup_min_interval, batch_url=None):
+        self.client = client
+        self.user_ids = user_ids
+        self.batch_url = batch_url
+        self.scheduler = PollScheduler(interval)
+        self.engine = NotificationEngine(popup_min_interval)
+        self.failures = 0
+        self._last_by_user = {}
+
+    @property
+    def name(self):
+        return self.user_ids[0] if len(self.user_ids) == 1 else self.user_ids
+
+    def breaker_state(self):
+        """この監視対象への送信に使うブレーカーの状態（複数名の一括取得はクライアント共通）"""
+        if len(self.user_ids) == 1:
+            return self.client.breaker_for(self.user_ids[0]).state
+        return self.client.breaker.state
+
+    def fetch(self):
+        if len(self.user_ids) == 1:
+            return self.client.fetch(self.user_ids[0])
+        got = self.client.fetch_many(self.user_ids, self.batch_url)
+        if not got:
+            return None
+        # 一部だけ失敗した場合はそのユーザーの前回値で補う
+        self._last_by_user.update(got)
+        if len(self._last_by_user) < len(self.user_ids):
+            return None
+        return aggregate_counts({uid: self._last_by_user[uid] for uid in self.user_ids})
+
+    def poll(self, emitter):
+        """1回取得してイベントを出し、(data, 次回までの秒数) を返す"""
+        data = self.fetch()
+        delay = self.scheduler.record(data)
+        if data is None:
+            self.failures += 1
+            # ブレーカー作動中は送信していない。最後に取得できた件数があれば添える
+            cached = self.client.cached(self.user_ids[0]) if len(self.user_ids) == 1 else None
+            emitter.emit("error", user=self.name, failures=self.failures,
+                         next_in=round(delay, 1), breaker=self.breaker_state(),
+                         cached=cached)
+            return None, delay
+        self.failures = 0
+        delta, popup = self.engine.process(data)
+        counts = {"total": data.get("order_requests_count", 0),
+                  "danger": data.get("danger_count", 0),
+                  "alert": data.get("alert_count", 0)}
+        emitter.emit("update", user=self.name, next_in=round(delay, 1),
+                     reason=self.scheduler.reason, **counts)
+        if popup:
+            emitter.emit("notify", user=self.name, new=delta.new, resolved=delta.resolved,
+                         escalated=delta.escalated, **counts)
+        return data, delay
+
+
+# ======================
+# 実行
+# ======================
+def run_once(watches, emitter):
+    """全監視対象を1回ずつ取得して終了コードを返す"""
+    results = [w.poll(emitter)[0] for w in watches]
+    if any(data is None for data in results):
+        return EXIT_API_ERROR
+    if any(data.get("order_requests_count", 0) > 0 for data in results):
+        return EXIT_PENDING
+    return EXIT_OK
+
+
+def run_loop(watches, emitter, workers, duration=None, max_failures=None, stop=None, reload=None):
+    """
+    監視対象ごとの次回時刻をヒープで管理し、期限の来たものだけ取得スレッドへ渡す。
+    待機中はスレッドを起こさないため、数千ユーザーでも監視対象ごとのスレッドは不要。
+    reload() は WATCH_INTERVAL ごとに呼ばれ、すぐ取得し直す監視対象の番号を返す。
+    """
+    stop = stop or threading.Event()
+    deadline = time.monotonic() + duration if duration else None
+    next_reload = time.monotonic() + WATCH_INTERVAL / 1000
+    result = {"code": EXIT_OK}
+    done = queue.SimpleQueue()  # (監視対象の番号, 次回までの秒数)
+    heap = [(time.monotonic(), i) for i in range(len(watches))]
+    heapq.heapify(heap)
+
+    def task(i):
+        try:
+            _, delay = watches[i].poll(emitter)
+        except Exception:
+            log.exception("取得処理エラー", extra={"user": watches[i].name})
+            delay = watches[i].scheduler.record(None)
+        if max_failures and watches[i].failures >= max_failures:
+            result["code"] = EXIT_API_ERROR
+            stop.set()
+        done.put((i, delay))
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="headless-fetch") as pool:
+        while not stop.is_set():
+            now = time.monotonic()
+            if deadline and now >= deadline:
+                break
+            if reload and now >= next_reload:
+                next_reload = now + WATCH_INTERVAL / 1000
+                due = set(reload())
+                if due:
+                    heap = [(now if i in due else t, i) for t, i in heap]
+                    heapq.heapify(heap)
+            while heap and heap[0][0] <= now:
+                _, i = heapq.heappop(heap)
+                pool.submit(task, i)
+            # 次の期限・取得完了・停止・設定の確認のいずれかまで待つ
+            timeout = heap[0][0] - now if heap else 1.0
+            if deadline:
+                timeout = min(timeout, deadline - now)
+            if reload:
+                timeout = min(timeout, next_reload - now)
+            try:
+                i, delay = done.get(timeout=max(0.0, min(timeout, 1.0)))
+            except queue.Empty:
+                continue
+            heapq.heappush(heap, (time.monotonic() + delay, i))
+        stop.set()
+    return result["code"]
+
+
+def reload_settings(watches, client, setting, new, args):
+    """
+    設定ファイルの内容 new を反映し、(変わった項目, すぐ取得し直す監視対象の番号) を返す。
+    --interval / --api-url / --users で指定した項目は設定ファイルより優先する。
+    """
+    changed = sorted(k for k, v in new.items() if setting.get(k) != v)
+    setting.update(new)
+    due = set()
+    if "refresh_interval" in changed and not args.interval:
+        for w in watches:
+            w.scheduler.set_interval(setting["refresh_interval"])
+    if "popup_min_interval" in changed:
+        for w in watches:
+            w.engine.min_interval = setting["popup_min_interval"]
+    if "api_url" in changed and not args.api_url:
+        client.api_url = setting["api_url"] or API_URL
+        due.update(range(len(watches)))
+    if not args.users and {"user_id", "user_ids", "batch_url"} & set(changed):
+        watches[0] = Watch(client, setting["user_ids"] or [setting["user_id"]],
+                           args.interval or setting["refresh_interval"],
+                           setting["popup_min_interval"], setting["batch_url"])
+        due.add(0)
+    return changed, due
+
+
+def parse_users(text):
+    """"2,5,7" や "1-1000" を user_id のリストにする"""
+    users = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            users.extend(range(int(lo), int(hi) + 1))
+        else:
+            users.append(int(part))
+    return users
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="承認件数の監視（GUIなし）")
+    parser.add_argument("--once", action="store_true", help="1回だけ取得して終了")
+    parser.add_argument("--users", help="個別に監視する user_id（例: 2,5,7 / 1-1000）")
+    parser.add_argument("--interval", type=int, help="基本の取得間隔（秒）")
+    parser.add_argument("--api-url", help="承認API URL（既定は設定ファイルの api_url）")
+    parser.add_argument("--webhook", help="イベントを POST する URL")
+    parser.add_argument("--socket", help="イベントを送るソケット（host:port または unix:/path）")
+    parser.add_argument("--no-stdout", action="store_true", help="標準出力へは出さない")
+    parser.add_argument("--events", default=",".join(EVENT_TYPES),
+                        help="出力するイベント（既定: %(default)s）")
+    parser.add_argument("--duration", type=float, help="指定秒数で終了")
+    parser.add_argument("--max-failures", type=int, help="連続失敗がこの回数に達したら終了コード3で終了")
+    parser.add_argument("--workers", type=int, default=8, help="同時に取得するスレッド数")
+    parser.add_argument("--shared-breaker", action="store_true",
+                        help="--users の全員で1つのサーキットブレーカーを使う（既定はユーザーごと）")
+    # main3.exe --headless から呼ばれた場合の --headless だけを除き、それ以外の誤りはエラーにする
+    argv = sys.argv[1:] if argv is None else argv
+    args = parser.parse_args([a for a in argv if a != "--headless"])
+
+    events = [e for e in args.events.split(",") if e]
+    unknown = set(events) - set(EVENT_TYPES)
+    if unknown:
+        parser.error(f"不明なイベント: {','.join(sorted(unknown))}")
+    try:
+        users = parse_users(args.users) if args.users else None
+    except ValueError:
+        parser.error(f"--users の形式が不正です: {args.users}")
+
+    setup_logging()
+    # 設定ファイルがあれば GUI 版と同じ値を使う（なければ作らずに既定値）
+    setting = load_settings() if os.path.exists(SETTING_FILE) else dict(DEFAULT_SETTING)
+    interval = args.interval or setting["refresh_interval"]
+    workers = max(1, args.workers)
+    client = ApprovalClient(api_url=args.api_url or setting["api_url"] or API_URL, pool_size=workers,
+                            per_user_breaker=bool(users) and not args.shared_breaker)
+
+    if users:
+        watches = [Watch(client, [uid], interval, setting["popup_min_interval"]) for uid in users]
+    else:
+        watches = [Watch(client, setting["user_ids"] or [setting["user_id"]], interval,
+                         setting["popup_min_interval"], setting["batch_url"])]
+
+    # --noconsole でビルドした main3.exe --headless では標準出力がない（sys.stdout が None）
+    sinks = [] if args.no_stdout or sys.stdout is None else [StdoutSink()]
+    if args.webhook:
+        sinks.append(WebhookSink(args.webhook, client.session))
+    if args.socket:
+        sinks.append(SocketSink(args.socket))
+    emitter = EventEmitter(sinks, events)
+    emitter.emit("start", watches=len(watches), interval=interval, once=args.once)
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *a: stop.set())
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, lambda *a: stop.set())
+
+    watcher = SettingsWatcher() if os.path.exists(SETTING_FILE) else None
+
+    def reload():
+        new = watcher.poll()
+        if new is None:
+            return ()
+        changed, due = reload_settings(watches, client, setting, new, args)
+        if changed:
+            log.info("設定変更を反映", extra={"changed": changed})
+            emitter.emit("reload", changed=changed)
+        return due
+
+    started = time.monotonic()
+    if args.once:
+        code = run_once(watches, emitter)
+    else:
+        code = run_loop(watches, emitter, workers, args.duration, args.max_failures, stop,
+                        reload if watcher else None)
+
+    snap = get_metrics().snapshot()
+    emitter.emit("summary", code=code, seconds=round(time.monotonic() - started, 1),
+                 polls=snap["counters"]["polls"], errors=snap["counters"]["errors"],
+                 not_modified=snap["counters"]["not_modified"],
+                 poll_p50=round(snap["poll_seconds"]["p50"], 4),
+                 poll_p95=round(snap["poll_seconds"]["p95"], 4))
+    emitter.close()
+    client.close()
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,16 +7,15 @@
 import tkinter as tk
 import threading
 import time
-import requests
 import sys
 import webbrowser
 import pystray
 from PIL import Image, ImageDraw
+from approval_api import get_client
 
 # ======================
 # 設定
 # ======================
-API_URL = "https://akioka.cloud/api/order_request/approval_requests"
 APPROVAL_URL = "https://akioka.cloud/accept/order-request"
 CHECK_INTERVAL = 60 * 30  # 秒（本番は30分）
 DEBUG = True
@@ -31,7 +30,20 @@ TEST_DATA = {
 # ======================
 # ポップアップ表示
 # ======================
+popup_lock = threading.Lock()  # 定期チェックと「今すぐ確認」で二重に開かないように
+
+
 def show_popup(data):
+    if not popup_lock.acquire(blocking=False):
+        print("[INFO] ポップアップ表示中のためスキップ")
+        return
+    try:
+        _show_popup(data)
+    finally:
+        popup_lock.release()
+
+
+def _show_popup(data):
     total = data.get("order_requests_count", 0)
     danger = data.get("danger_count", 0)
     alert = data.get("alert_count", 0)
@@ -96,16 +108,7 @@ def check_pending_approvals():
         time.sleep(1)
         return TEST_DATA
 
-    try:
-        response = requests.get(API_URL, params={"user_id": USER_ID}, timeout=10)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            print(f"HTTPエラー: {response.status_code}")
-            return None
-    except Exception as e:
-        print(f"APIエラー: {e}")
-        return None
+    return get_client().fetch(USER_ID)
 
 # ======================
 # 定期チェックループ
@@ -8,49 +8,22 @@
 """
 
 import tkinter as tk
-import requests
 import threading
 import time
-import json
-import os
 import webbrowser
+from approval_api import get_client
+from settings_store import SIZE_MIN, SIZE_MAX, load_settings, save_settings, flush_settings
 
 # ======================
 # 設定
 # ======================
-API_URL = "https://akioka.cloud/api/order_request/approval_requests"
 APPROVAL_URL = "https://akioka.cloud/accept/order-request"
 USER_ID = 2
 DEBUG = True
 REFRESH_INTERVAL = 60  # 秒
-SETTINGS_FILE = "settings.json"
 
 TEST_DATA = {"order_requests_count": 14, "danger_count": 8, "alert_count": 2}
 
-# ======================
-# 設定ファイル読み込み・保存
-# ======================
-def load_settings():
-    default = {"x": None, "y": None, "size": 100}
-    if os.path.exists(SETTINGS_FILE):
-        try:
-            with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                default.update(data)
-        except Exception as e:
-            print("設定読み込みエラー:", e)
-    return default
-
-
-def save_settings(x, y, size):
-    data = {"x": x, "y": y, "size": size}
-    try:
-        with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print("設定保存エラー:", e)
-
-
 # ======================
 # API呼び出し
 # ======================
@@ -59,16 +32,7 @@ def fetch_data():
         print("[DEBUG] ダミーデータ使用中")
         time.sleep(1)
         return TEST_DATA
-    try:
-        res = requests.get(API_URL, params={"user_id": USER_ID}, timeout=10)
-        if res.status_code == 200:
-            return res.json()
-        else:
-            print("HTTPエラー:", res.status_code)
-            return None
-    except Exception as e:
-        print("APIエラー:", e)
-        return None
+    return get_client().fetch(USER_ID)
 
 
 # ======================
@@ -185,7 +149,7 @@ def open_page(event=None):
 # ======================
 drag_data = {"x": 0, "y": 0}
 settings = load_settings()
-current_size = settings.get("size", 100)
+current_size = settings["size"]
 
 
 def start_drag(event):
@@ -203,13 +167,16 @@ def resize(event):
     global current_size
     if event.state & 0x0004:  # Ctrlキー押下中
         delta = 10 if event.delta > 0 else -10
-        current_size = max(50, min(300, current_size + delta))
+        current_size = max(SIZE_MIN, min(SIZE_MAX, current_size + delta))
         label.config(font=("Meiryo", int(current_size / 3), "bold"))
         root.geometry(f"{current_size}x{current_size}+{root.winfo_x()}+{root.winfo_y()}")
 
 
 def on_close():
-    save_settings(root.winfo_x(), root.winfo_y(), current_size)
+    # 設定は main3.py と共通の approval-notify-setting.json に保存
+    settings.update(x=root.winfo_x(), y=root.winfo_y(), size=current_size)
+    save_settings(settings)
+    flush_settings()
     root.destroy()
 
 
@@ -2,95 +2,87 @@
 # -*- coding: utf-8 -*-
 """
 承認通知 常駐アプリ（トレイアイコン表示 + 起動自動化 + 管理者GUI）
+
+起動を速くするため requests / Pillow / pystray / webbrowser / simpledialog は
+初回使用時に読み込む（バッジの仮表示を先に出す）。
 """
 
+import time
+STARTUP_T0 = time.perf_counter()
+
 import tkinter as tk
-from tkinter import messagebox, simpledialog
 import threading
-import time
-import json
 import os
-import webbrowser
-import requests
-import pystray
-from PIL import Image, ImageDraw
 import sys   # ←★ 追加！
+import logging
+from app_log import setup_logging, stop_logging
+from approval_api import get_client, configure_client, aggregate_counts, breaker_state
+from push_client import PushListener
+from scheduler import PollScheduler
+from core_loop import AsyncPoller, Inbox, TkBridge, get_core
+from count_cache import load_counts, save_counts
+from notify_engine import NotificationEngine
+from metrics import get_metrics, serve_metrics
+from presence import AWAY, IDLE, IDLE_FACTOR, PRESENCE_INTERVAL, PresenceMonitor, create_provider
+from single_instance import SingleInstance, parse_command, send_command
+from settings_store import (SIZE_MIN, SIZE_MAX, WATCH_INTERVAL, SettingsWatcher,
+                            load_settings, save_settings, flush_settings, validate_settings)
 
 # ======================
 # 定数設定
 # ======================
-SETTING_FILE = "approval-notify-setting.json"
 ICON_FILE = "icon.png"
-DEFAULT_SETTING = {
-    "user_id": 2,
-    "size": 120,
-    "x": None,
-    "y": None,
-    "refresh_interval": 60
-}
+ICON_CACHE_FILE = "icon-64.png"   # 縮小済みアイコン（起動時に元画像を展開しない）
+TRAY_ICON_SIZE = 64
+TRAY_BADGE_SIZE = 40
 ADMIN_PASSWORD = "Akioka55"
 
-API_URL = "https://akioka.cloud/api/order_request/approval_requests"
 APPROVAL_URL = "https://akioka.cloud/accept/order-request"
 DEBUG = False
 TEST_DATA = {"order_requests_count": 14, "danger_count": 8, "alert_count": 2}
 
-# ======================
-# 設定ファイル管理
-# ======================
-def load_settings():
-    if not os.path.exists(SETTING_FILE):
-        save_settings(DEFAULT_SETTING)
-        return DEFAULT_SETTING
-    try:
-        with open(SETTING_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        for k, v in DEFAULT_SETTING.items():
-            if k not in data:
-                data[k] = v
-        return data
-    except Exception as e:
-        print("設定読み込みエラー:", e)
-        return DEFAULT_SETTING
-
-
-def save_settings(data):
-    try:
-        with open(SETTING_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        print("[INFO] 設定保存:", data)
-    except Exception as e:
-        print("設定保存エラー:", e)
-
+log = logging.getLogger("main3")
 
 # ======================
 # API呼び出し
 # ======================
-def fetch_data(user_id):
+def fetch_data(user_id, batch_url=None):
+    """user_id にリストを渡すと複数ユーザー分を {user_id: data} で返す"""
+    multi = isinstance(user_id, (list, tuple))
     if DEBUG:
         time.sleep(1)
-        return TEST_DATA
-    try:
-        res = requests.get(API_URL, params={"user_id": user_id}, timeout=10)
-        if res.status_code == 200:
-            return res.json()
-        else:
-            print("HTTPエラー:", res.status_code)
-            return None
-    except Exception as e:
-        print("APIエラー:", e)
-        return None
+        return {uid: TEST_DATA for uid in user_id} if multi else TEST_DATA
+    if multi:
+        return get_client().fetch_many(user_id, batch_url)
+    # 接続を使い回し、変化がなければ 304 で前回値を返す
+    return get_client().fetch(user_id)
+
+
+def badge_color(data):
+    """状況によってカラー変更（モダンな配色）"""
+    if data.get("danger_count", 0) > 0:
+        return "#FF5252"  # マテリアルレッド（より鮮やかで視認性が高い）
+    if data.get("alert_count", 0) > 0:
+        return "#FF9800"  # マテリアルオレンジ（温かみのある警告色）
+    return "#546E7A"  # マテリアルブルーグレー（濃い色で視認性向上）
 
 
 # ======================
 # 承認ポップアップ
 # ======================
-def show_popup(data, setting):
-    total = data.get("order_requests_count", 0)
-    danger = data.get("danger_count", 0)
-    alert = data.get("alert_count", 0)
+_popup = {}  # 監視ループ（Tk）1回分の間だけ使い回すポップアップのウィジェット
+# 起動中の監視ループが登録する処理（Tk スレッドから呼ぶ。終了時に release_windows で破棄）
+#   offload(fn, done)   : fn を通信スレッドで実行し、結果を Tk スレッドで done に渡す
+#   apply_settings(new) : 設定を直ちに反映する（管理者GUIでの保存時）
+_notifier = {}
+_popup_stats = {"builds": 0, "shows": 0, "build_ms": 0.0}
+
 
+def _build_popup():
+    """ポップアップを作成して非表示のまま保持（表示は show_popup）"""
+    start = time.perf_counter()
     popup = tk.Toplevel()
+    popup.withdraw()
     popup.title("承認通知")
     popup.geometry("960x600+{}+{}".format(
         (popup.winfo_screenwidth() // 2) - 480,
@@ -98,18 +90,19 @@ def show_popup(data, setting):
     ))
     popup.attributes("-topmost", True)
     popup.configure(bg="white")
+    # 閉じても破棄せず隠すだけ（次回は内容を差し替えて再表示）
+    popup.protocol("WM_DELETE_WINDOW", popup.withdraw)
 
-    title = tk.Label(popup, text=f"未承認の申請が {total} 件あります。",
-                     font=("Meiryo", 28, "bold"), bg="white", pady=40)
+    title = tk.Label(popup, font=("Meiryo", 28, "bold"), bg="white", pady=40)
     title.pack()
 
     frame = tk.Frame(popup, bg="white")
     frame.pack(pady=20)
 
-    tk.Label(frame, text=str(danger), font=("Meiryo", 60, "bold"),
-             fg="red", bg="white").grid(row=0, column=0, padx=100)
-    tk.Label(frame, text=str(alert), font=("Meiryo", 60, "bold"),
-             fg="orange", bg="white").grid(row=0, column=1, padx=100)
+    danger_label = tk.Label(frame, font=("Meiryo", 60, "bold"), fg="red", bg="white")
+    danger_label.grid(row=0, column=0, padx=100)
+    alert_label = tk.Label(frame, font=("Meiryo", 60, "bold"), fg="orange", bg="white")
+    alert_label.grid(row=0, column=1, padx=100)
 
     label_row = tk.Frame(popup, bg="white")
     label_row.pack()
@@ -118,35 +111,150 @@ def show_popup(data, setting):
     tk.Label(label_row, text="期限が近い", font=("Meiryo", 18),
              bg="white", fg="orange").grid(row=0, column=1, padx=180)
 
+    # 複数ユーザー監視時はユーザーごとの内訳
+    users_label = tk.Label(popup, font=("Meiryo", 12), bg="white", justify="left")
+    users_label.pack(pady=(10, 0))
+
     def open_approval_page():
-        webbrowser.open(f"{APPROVAL_URL}?user_id={setting['user_id']}")
-        popup.destroy()
+        import webbrowser
+        webbrowser.open(f"{APPROVAL_URL}?user_id={_popup['setting']['user_id']}")
+        popup.withdraw()
 
     def open_admin_panel():
-        password = simpledialog.askstring("管理者認証", "パスワードを入力してください:", show="*")
+        from tkinter import messagebox, simpledialog
+        password = simpledialog.askstring("管理者認証", "パスワードを入力してください:",
+                                          show="*", parent=popup)
         if password == ADMIN_PASSWORD:
-            popup.destroy()
-            open_admin_window(setting)
+            popup.withdraw()
+            open_admin_window(_popup["setting"], popup.master, _notifier.get("apply_settings"))
         else:
-            messagebox.showerror("エラー", "パスワードが違います。")
+            messagebox.showerror("エラー", "パスワードが違います。", parent=popup)
 
     btns = tk.Frame(popup, bg="white")
     btns.pack(pady=50)
-    tk.Button(btns, text="閉じる", command=popup.destroy,
-              width=15, height=2, font=("Meiryo", 16)).grid(row=0, column=0, padx=30)
+    tk.Button(btns, text="閉じる", command=popup.withdraw,
+              width=12, height=2, font=("Meiryo", 16)).grid(row=0, column=0, padx=16)
+    detail_btn = tk.Button(btns, text="一覧を見る",
+                           command=lambda: open_detail(_popup["data"], _popup["setting"]),
+                           width=12, height=2, font=("Meiryo", 16))
+    detail_btn.grid(row=0, column=1, padx=16)
     tk.Button(btns, text="承認ページを開く", command=open_approval_page,
-              width=20, height=2, font=("Meiryo", 16), bg="#0078D7", fg="white").grid(row=0, column=1, padx=30)
+              width=18, height=2, font=("Meiryo", 16), bg="#0078D7", fg="white").grid(row=0, column=2, padx=16)
     tk.Button(btns, text="管理者用", command=open_admin_panel,
-              width=15, height=2, font=("Meiryo", 16), bg="gray", fg="white").grid(row=0, column=2, padx=30)
+              width=12, height=2, font=("Meiryo", 16), bg="gray", fg="white").grid(row=0, column=3, padx=16)
 
-    popup.mainloop()
+    _popup.update(window=popup, title=title, danger=danger_label, alert=alert_label,
+                  users=users_label, detail=detail_btn)
+    _popup_stats["builds"] += 1
+    _popup_stats["build_ms"] = (time.perf_counter() - start) * 1000
+
+
+def show_popup(data, setting):
+    """承認ポップアップを表示（Toplevel は使い回し、mainloop は入れ子にしない）"""
+    total = data.get("order_requests_count", 0)
+    danger = data.get("danger_count", 0)
+    alert = data.get("alert_count", 0)
+
+    if not _popup:
+        _build_popup()  # 監視ループの起動後、初回の表示時に作成（終了時は release_windows で破棄）
+
+    _popup["setting"] = setting
+    _popup["data"] = data
+    # 明細の取得元（items_url または件数レスポンスの items）がある時だけ一覧を開ける
+    _popup["detail"].config(state="normal" if item_source(setting, data) else "disabled")
+    _popup["title"].config(text=f"未承認の申請が {total} 件あります。")
+    _popup["danger"].config(text=str(danger))
+    _popup["alert"].config(text=str(alert))
+
+    users = data.get("users") or {}
+    lines = [f"ID {uid}：{d.get('order_requests_count', 0)} 件"
+             f"（至急 {d.get('danger_count', 0)} / 期限 {d.get('alert_count', 0)}）"
+             for uid, d in users.items()] if len(users) > 1 else []
+    _popup["users"].config(text="\n".join(lines))
+
+    window = _popup["window"]
+    window.deiconify()
+    window.lift()
+    window.focus_force()
+    _popup_stats["shows"] += 1
+    get_metrics().incr("popups")
+
+
+# ======================
+# 承認待ち明細の一覧
+# ======================
+_detail = {}  # 一覧ウィンドウ（監視ループ1回分）とページキャッシュ（開き直しても保持）
+
+
+def item_source(setting, data):
+    """明細1ページを返す関数。items_url があれば API、なければ件数レスポンスの items を使う"""
+    if setting.get("items_url"):
+        client = get_client()
+        return lambda uid, page, per_page: client.fetch_items(setting["items_url"], uid,
+                                                              page, per_page)
+    items = data.get("items")
+    if isinstance(items, list):
+        return lambda uid, page, per_page: {"items": items[page * per_page:(page + 1) * per_page],
+                                            "total": len(items)}
+    return None
+
+
+def open_detail(data, setting):
+    """明細一覧を開く（ページは見える範囲の分だけ取得し、件数の版が同じ間は再取得しない）"""
+    from detail_view import DetailView, PageCache
+    source = item_source(setting, data)
+    if source is None:
+        return
+    if "cache" not in _detail:
+        _detail["cache"] = PageCache()
+    _detail["cache"].fetch_page = source
+
+    view = _detail.get("view")
+    if view is None:
+        def open_page():
+            import webbrowser
+            webbrowser.open(f"{APPROVAL_URL}?user_id={_popup['setting']['user_id']}")
+        view = _detail["view"] = DetailView(_popup["window"].master, _detail["cache"],
+                                            _notifier["offload"], open_page)
+
+    user_id = setting["user_id"]
+    counts = (data.get("users") or {}).get(user_id, data)
+    total = counts.get("order_requests_count", 0)
+    # 件数レスポンスの ETag を版として使い、なければ件数の組で代用
+    version = get_client().version(user_id) or "{}-{}-{}".format(
+        total, counts.get("danger_count", 0), counts.get("alert_count", 0))
+    view.show(user_id, version, total)
+
+
+def release_windows():
+    """監視ループの終了時に同じ Tk スレッドで呼ぶ：ポップアップ・一覧への参照を手放す
+    （バッジを開き直すと別スレッドに新しい Tk ができるため、前の Tk のウィジェットは使い回さない。
+      別スレッドの Tcl インタープリタのウィジェットに触れると RuntimeError や異常終了になる）"""
+    _popup.clear()
+    _detail.pop("view", None)
+    _notifier.clear()
+
+
+def popup_widget_count():
+    """ポップアップ配下のウィジェット数（使い回しで増えないことの確認用）"""
+    if not _popup:
+        return 0
+    stack, count = [_popup["window"]], 0
+    while stack:
+        widget = stack.pop()
+        count += 1
+        stack.extend(widget.winfo_children())
+    return count
 
 
 # ======================
 # 管理者設定GUI
 # ======================
-def open_admin_window(setting):
-    admin = tk.Tk()
+def open_admin_window(setting, master, on_saved=None):
+    """設定画面（バッジと同じ Tk の子ウィンドウ。mainloop は入れ子にしない）
+    on_saved(setting) は保存後に呼ばれる（自分の書き込みは設定ファイルの監視では取り込まないため）"""
+    from tkinter import messagebox
+    admin = tk.Toplevel(master)
     admin.title("承認通知 設定")
     admin.geometry("400x350")
     admin.configure(bg="white")
@@ -158,11 +266,15 @@ def open_admin_window(setting):
             setting["x"] = int(entry_x.get()) if entry_x.get() else None
             setting["y"] = int(entry_y.get()) if entry_y.get() else None
             setting["refresh_interval"] = int(entry_interval.get())
+            setting.update(validate_settings(setting))
             save_settings(setting)
-            messagebox.showinfo("保存完了", "設定を保存しました。再起動時に反映されます。")
+            flush_settings()
+            if on_saved:
+                on_saved(dict(setting))
+            messagebox.showinfo("保存完了", "設定を保存して反映しました。", parent=admin)
             admin.destroy()
         except Exception as e:
-            messagebox.showerror("入力エラー", str(e))
+            messagebox.showerror("入力エラー", str(e), parent=admin)
 
     tk.Label(admin, text="設定値の編集", font=("Meiryo", 16, "bold"),
              bg="white", pady=10).pack()
@@ -190,25 +302,55 @@ def open_admin_window(setting):
               font=("Meiryo", 12), bg="#0078D7", fg="white",
               width=20).pack(pady=20)
 
-    admin.mainloop()
+
+# ======================
+# 計測値の公開
+# ======================
+_metrics_server = None
+
+
+async def start_metrics_server(port):
+    """コアループ上で待ち受ける（get_core().submit で呼ぶ）"""
+    global _metrics_server
+    if not port or _metrics_server is not None:
+        return
+    try:
+        _metrics_server = await serve_metrics(get_metrics(), port)
+        log.info("計測値公開: http://127.0.0.1:%s/metrics", port)
+    except OSError as e:
+        log.error("計測値公開エラー: %s", e, extra={"port": port})
 
 
 # ======================
 # 常駐ウィンドウ（監視）
 # ======================
-def run_notifier():
-    """承認状況を監視し、デスクトップ右下に通知バッジを表示"""
+def run_notifier(on_update=None, commands=None):
+    """承認状況を監視し、デスクトップ右下に通知バッジを表示
+    on_update(count, color) はバッジ更新のたびに Tk スレッドで呼ばれる（トレイアイコン連動用）
+    commands は2つ目の起動から届いた指示の受け口 Inbox（refresh / popup / reload）
+    取得・タイマーはコアループ（core_loop）で行い、描画に関わる処理だけを TkBridge で Tk へ渡す"""
     setting = load_settings()
     user_id = setting["user_id"]
+    # 複数ユーザー監視（秘書が複数役員の承認を見る場合など）
+    user_ids = setting["user_ids"] or [user_id]
+    multi = len(user_ids) > 1
+    cache_key = user_ids if multi else user_id
+    # api_url を拠点リレーに向けると akioka.cloud への直接アクセスをまとめられる
+    configure_client(setting["api_url"])
     refresh = setting["refresh_interval"]
     size = setting["size"]
     drag = {"x": 0, "y": 0}
     current_size = size
-    prev_total = None
-    first = True
-    
+    # 前回終了時までに取得できた件数（起動直後・オフライン時に表示）
+    cached, last_ok = load_counts(cache_key)
+    latest = {"data": cached}  # 最後に表示した件数（指示によるポップアップ表示用）
+    stale_after = setting["stale_after"]
+
+    # 新規・緊急度上昇の判定とポップアップの間引き（前回値と同じなら初回も出さない）
+    notifier = NotificationEngine(setting["popup_min_interval"], baseline=cached)
+
     # 現在の表示状態を保存（リサイズ時の再描画用）
-    current_display = {"count": "--", "color": "#546E7A"}
+    current_display = {"count": "--", "color": "#546E7A", "stale": False}
 
     # ----------------------------------------
     # メインウィンドウ設定
@@ -234,43 +376,76 @@ def run_notifier():
     canvas = tk.Canvas(root, width=size, height=size, highlightthickness=0, bg=TRANSPARENT_COLOR)
     canvas.pack(expand=True, fill="both")
 
-    def draw_badge(count="--", color="#555555"):
-        """モダンでシンプルなバッジUIを描画"""
-        nonlocal size, current_display
-        
-        # 現在の表示状態を保存
+    # アンチエイリアス済みのバッジ画像を (サイズ, 色, 件数) ごとにキャッシュ
+    badge_images = None
+
+    # API 障害でサーキットブレーカーが作動中か（作動中は前回値を薄く表示し、ラベルで示す）
+    offline = False
+
+    def badge_label():
+        if offline:
+            return "接続待機中"
+        return f"{len(user_ids)}名の承認待ち" if multi else "承認待ち"
+    drawn = {"key": None}
+
+    def draw_placeholder(count="--", color="#546E7A"):
+        """起動直後の仮バッジ（Pillow を読み込む前に Canvas だけで即座に表示）"""
         current_display["count"] = count
         current_display["color"] = color
-        
-        canvas.delete("all")
         r = int(size / 2.2)
-        cx, cy = size // 2, size // 2
-
-        # ソフトな外側の影（透過背景に対応）
-        shadow_colors = ["#1a1a1a", "#121212", "#0a0a0a"]
-        for i, shadow_color in enumerate(shadow_colors):
-            offset = 8 - i * 2
-            canvas.create_oval(cx - r - offset, cy - r - offset, 
-                             cx + r + offset, cy + r + offset,
-                             fill=shadow_color, outline="", width=0)
-
-        # メインの円形バッジ（フラットデザイン）
-        canvas.create_oval(cx - r, cy - r, cx + r, cy + r,
-                           fill=color, outline="", width=0)
-
-        # 件数表示（より大きく、クリーンに）
-        font_size = max(10, int(size / 2.8))  # 最小フォントサイズを保証
-        canvas.create_text(cx, cy - int(size * 0.05), text=str(count),
-                           font=("Segoe UI", font_size, "bold"), 
-                           fill="white", anchor="center")
-
-        # 下部ラベル（より小さく控えめに）
-        label_font_size = max(8, int(size / 9))  # 最小フォントサイズを保証
-        canvas.create_text(cx, cy + int(size * 0.18), text="承認待ち",
-                           font=("Yu Gothic UI", label_font_size), 
-                           fill="#FFFFFF", anchor="center")
-
-    draw_badge("--", "#546E7A")
+        c = size // 2
+        canvas.create_oval(c - r, c - r, c + r, c + r, fill=color, outline="",
+                           width=0, tags="placeholder")
+        canvas.create_text(c, c, text=str(count), fill="white", anchor="center",
+                           font=("Segoe UI", max(10, int(size / 2.8)), "bold"),
+                           tags="placeholder")
+
+    def draw_badge(count="--", color="#555555", stale=False):
+        """モダンでシンプルなバッジUIを描画（状態が変わった時のみ画像を差し替え）
+        stale=True の場合は古い値として薄く表示"""
+        nonlocal size, current_display, badge_images
+
+        # 現在の表示状態を保存
+        current_display["count"] = count
+        current_display["color"] = color
+        current_display["stale"] = stale
+
+        key = (size, color, count, stale)
+        if drawn["key"] == key:
+            return
+        start = time.perf_counter()
+        if badge_images is None:
+            from PIL import ImageTk
+            from badge import BadgeRenderer
+            badge_images = BadgeRenderer(convert=ImageTk.PhotoImage, label=badge_label())
+            canvas.delete("placeholder")
+        image = badge_images.render(size, color, count, stale)
+        if drawn["key"] is None:
+            canvas.create_image(0, 0, anchor="nw", image=image, tags="badge")
+        else:
+            canvas.itemconfig("badge", image=image)
+        drawn["key"] = key
+        get_metrics().record_render(time.perf_counter() - start)
+
+    if cached:
+        draw_placeholder(cached.get("order_requests_count", 0), badge_color(cached))
+    else:
+        draw_placeholder()
+    if "--measure-startup" in sys.argv:
+        # 起動時間計測用：初回描画までの時間を出力して終了
+        root.update()
+        print(f"first_paint_ms={(time.perf_counter() - STARTUP_T0) * 1000:.1f}")
+        os._exit(0)
+
+    # ----------------------------------------
+    # コアループとの受け渡し（取得・タイマーはループ側、描画は Tk 側）
+    # ----------------------------------------
+    core = get_core()
+    bridge = TkBridge(root)
+    _notifier["offload"] = lambda fn, done: core.offload(fn, lambda result: bridge.post(done, result))
+
+    # 計測値の HTTP 公開（metrics_port 設定時のみ、127.0.0.1 限定）
+    core.submit(start_metrics_server(setting["metrics_port"]))
 
     # ----------------------------------------
     # ドラッグ・リサイズ
@@ -287,59 +462,246 @@ def run_notifier():
         nonlocal current_size, size
         if e.state & 0x0004:  # Ctrlキー押下中
             delta = 10 if e.delta > 0 else -10
-            current_size = max(80, min(300, current_size + delta))
+            current_size = max(SIZE_MIN, min(SIZE_MAX, current_size + delta))
             size = current_size  # 描画サイズを更新
             canvas.config(width=current_size, height=current_size)
             # 現在表示中の件数と色で再描画
-            draw_badge(current_display["count"], current_display["color"])
+            draw_badge(current_display["count"], current_display["color"],
+                       current_display["stale"])
             root.geometry(f"{current_size}x{current_size}+{root.winfo_x()}+{root.winfo_y()}")
+            remember_geometry()
 
-    def on_close():
+    def remember_geometry(e=None):
+        """位置・サイズを保存（連続した変更は settings_store 側で1回にまとめる）"""
         setting.update(x=root.winfo_x(), y=root.winfo_y(), size=current_size)
+        applied.update(x=setting["x"], y=setting["y"], size=current_size)  # 反映済みの位置として扱う
         save_settings(setting)
+
+    def on_close():
+        remember_geometry()
+        flush_settings()
         root.destroy()
 
     def open_page(e=None):
+        import webbrowser
         webbrowser.open(f"{APPROVAL_URL}?user_id={user_id}")
 
     # ----------------------------------------
     # データ更新ループ
     # ----------------------------------------
-    def update_label():
-        nonlocal prev_total, first
-        data = fetch_data(user_id)
-        if not data:
-            root.after(refresh * 1000, update_label)
-            return
-
+    def apply_data(data):
+        nonlocal last_ok
         total = data.get("order_requests_count", 0)
-        danger, alert = data.get("danger_count", 0), data.get("alert_count", 0)
-
-        # 状況によってカラー変更（モダンな配色）
-        if danger > 0:
-            color = "#FF5252"  # マテリアルレッド（より鮮やかで視認性が高い）
-        elif alert > 0:
-            color = "#FF9800"  # マテリアルオレンジ（温かみのある警告色）
-        else:
-            color = "#546E7A"  # マテリアルブルーグレー（濃い色で視認性向上）
+        color = badge_color(data)
+        last_ok = time.time()
+        latest["data"] = data
 
         draw_badge(total, color)
+        if on_update:
+            on_update(total, color)
 
         # ポップアップを安全に呼び出す
-        if first:
-            root.after(0, lambda: show_popup(data, setting))
-            first = False
-        elif prev_total is not None and total > prev_total:
+        _, popup = notifier.process(data)
+        if popup:
             root.after(0, lambda: show_popup(data, setting))
 
-        prev_total = total
-        root.after(refresh * 1000, update_label)
+    stale_timer = None
+
+    def check_stale():
+        """最終取得から stale_after 秒を超えた時、またはブレーカー作動中は
+        バッジを古い値の表示に切り替える（結果の反映時と、古くなる予定の時刻に呼ばれる）
+        stale_after が 0 の場合は経過時間では薄くしない（ブレーカー作動中のみ）"""
+        nonlocal offline, stale_timer
+        if (breaker_state() != "closed") != offline:
+            offline = not offline
+            if badge_images is not None:
+                badge_images.set_label(badge_label())
+                drawn["key"] = ()  # 件数が同じでもラベルを描き直させる
+        expires = stale_after > 0 and last_ok is not None
+        stale = offline or (expires and time.time() - last_ok > stale_after)
+        if stale != current_display["stale"] or drawn["key"] == ():
+            draw_badge(current_display["count"], current_display["color"], stale)
+        if stale_timer is not None:
+            root.after_cancel(stale_timer)
+            stale_timer = None
+        if not stale and expires:
+            # 一定間隔で確認せず、古くなる時刻に1回だけ確認する
+            wait = max(0, int((last_ok + stale_after - time.time()) * 1000))
+            stale_timer = root.after(wait + 50, check_stale)
+
+    def handle_command(command):
+        """2つ目の起動から届いた指示を Tk スレッドで実行する"""
+        if command == "refresh":
+            poller.resume()
+            poller.trigger()
+        elif command == "popup":
+            if latest["data"] is not None:
+                show_popup(latest["data"], setting)
+            else:
+                poller.trigger()  # まだ件数がなければ取得を優先
+        elif command == "reload":
+            apply_settings(load_settings())
+
+    def show_result(data):
+        if data:
+            apply_data(data)
+        check_stale()
+
+    def on_fetched(data):
+        """ループ上で呼ばれる：取得できた時とブレーカー作動中だけ Tk スレッドを起こす"""
+        if data or breaker_state() != "closed":
+            bridge.post(show_result, data)
+
+    last_by_user = {}
+
+    def fetch_counts():
+        """複数ユーザー時は1回のバッチ（または並行取得）で集め、合計を返す"""
+        if not multi:
+            return fetch_data(user_id)
+        got = fetch_data(user_ids, setting["batch_url"])
+        if not got:
+            return None
+        # 一部だけ失敗した場合はそのユーザーの前回値で補う
+        last_by_user.update(got)
+        if len(last_by_user) < len(user_ids):
+            return None
+        return aggregate_counts({uid: last_by_user[uid] for uid in user_ids})
+
+    def fetch_and_store():
+        """通信スレッド上で呼ばれる：成功した値はディスクにも保存
+        取得中に監視対象が変わった場合、前の対象の値は捨てる（新しい対象として表示しない）"""
+        key = cache_key
+        data = fetch_counts()
+        if key != cache_key:
+            return None
+        if data:
+            save_counts(key, data)
+        return data
+
+    # ----------------------------------------
+    # プッシュ受信（設定時のみ。切断中は通常ポーリングで補完）
+    # ----------------------------------------
+    push = None
+
+    def start_push():
+        nonlocal push
+        if push:
+            push.stop()
+            push = None
+        if setting.get("push_url") and not multi:
+            push = PushListener(setting["push_url"], user_id,
+                                lambda data: bridge.post(show_result, data),
+                                mode=setting.get("push_mode", "sse"))
+            push.start()
+
+    # 待ち時間の管理はコアループ、通信は通信スレッドで行い、失敗時のバックオフ・
+    # 変化なし時の延長・至急案件時の短縮は PollScheduler が判断する
+    scheduler = PollScheduler(refresh)
+    poller = AsyncPoller(core, fetch_and_store, scheduler, on_fetched,
+                         should_fetch=lambda: push is None or not push.connected)
+
+    # ----------------------------------------
+    # 在席状態（離席中は間隔を延ばす・止める。戻ったら即取得）
+    # ----------------------------------------
+    presence = None
+
+    def check_presence():
+        """ループ上で呼ばれる（取得の停止・再開もループ側で完結し、Tk は起こさない）"""
+        nonlocal presence
+        if presence is None:
+            # OS への問い合わせの準備は初回描画の後に行う（取得できない環境では常に在席扱い）
+            presence = PresenceMonitor(create_provider(), setting["idle_after"],
+                                       setting["away_after"])
+        previous = presence.state
+        state, returned = presence.poll()
+        if state != previous:
+            log.info("在席状態: %s → %s", previous, state)
+            scheduler.slowdown = IDLE_FACTOR if state == IDLE else 1
+            if state == AWAY:
+                poller.pause("離席中")
+            else:
+                poller.resume()
+            if returned:
+                poller.trigger()
+
+    # ----------------------------------------
+    # 設定ファイルの変更を再起動なしで反映
+    # ----------------------------------------
+    watcher = SettingsWatcher()
+    applied = dict(setting)  # 最後に反映した内容（管理者GUIは setting を直接書き換えるため別に保持）
+
+    def apply_settings(new):
+        nonlocal user_id, user_ids, multi, cache_key, refresh, stale_after, size, current_size, \
+            notifier, last_ok
+        changed = {k for k, v in new.items() if applied.get(k) != v}
+        if not changed:
+            return
+        log.info("設定変更を反映", extra={"changed": sorted(changed)})
+        applied.clear()
+        applied.update(new)
+        setting.update(new)
+
+        if "api_url" in changed:
+            configure_client(setting["api_url"])
+        if changed & {"user_id", "user_ids"}:
+            user_id = setting["user_id"]
+            user_ids = setting["user_ids"] or [user_id]
+            multi = len(user_ids) > 1
+            cache_key = user_ids if multi else user_id
+            last_by_user.clear()
+            # 前の対象の件数・通知済みの明細・取得間隔の判断を引き継がない（起動時と同じ状態から）
+            cached, last_ok = load_counts(cache_key)
+            latest["data"] = cached
+            notifier = NotificationEngine(setting["popup_min_interval"], baseline=cached)
+            scheduler.reset()
+            if badge_images is not None:
+                badge_images.set_label(badge_label())
+                drawn["key"] = ()  # 件数が同じでもラベルを描き直させる
+            # 新しい対象の前回値（なければ起動直後の仮バッジと同じ表示）
+            count, color = ((cached.get("order_requests_count", 0), badge_color(cached))
+                            if cached else ("--", "#546E7A"))
+            draw_badge(count, color)
+            if on_update:
+                on_update(count, color)
+        if "refresh_interval" in changed:
+            refresh = setting["refresh_interval"]
+            scheduler.set_interval(refresh)
+        if "stale_after" in changed:
+            stale_after = setting["stale_after"]
+        if "popup_min_interval" in changed:
+            notifier.min_interval = setting["popup_min_interval"]
+        if presence is not None and changed & {"idle_after", "away_after"}:
+            presence.idle_after = setting["idle_after"]
+            presence.away_after = setting["away_after"]
+        if changed & {"push_url", "push_mode", "user_id", "user_ids"}:
+            start_push()
+        if changed & {"size", "x", "y"}:
+            size = current_size = setting["size"]
+            canvas.config(width=size, height=size)
+            x = setting["x"] if setting["x"] is not None else root.winfo_x()
+            y = setting["y"] if setting["y"] is not None else root.winfo_y()
+            root.geometry(f"{size}x{size}+{x}+{y}")
+        draw_badge(current_display["count"], current_display["color"], current_display["stale"])
+        check_stale()
+
+        # 接続先・対象・間隔が変わった場合は待たずに取得し直す
+        if changed & {"api_url", "user_id", "user_ids", "batch_url", "refresh_interval"}:
+            poller.trigger()
+
+    _notifier["apply_settings"] = apply_settings
+
+    def check_settings():
+        """ループ上で呼ばれる：変更があった時だけ Tk スレッドで反映する"""
+        new = watcher.poll()
+        if new is not None:
+            bridge.post(apply_settings, new)
 
     # ----------------------------------------
     # イベントバインド
     # ----------------------------------------
     canvas.bind("<Button-1>", drag_start)
     canvas.bind("<B1-Motion>", drag_move)
+    canvas.bind("<ButtonRelease-1>", remember_geometry)
     canvas.bind("<MouseWheel>", resize)
     canvas.bind("<Double-Button-1>", open_page)
     root.protocol("WM_DELETE_WINDOW", on_close)
@@ -347,16 +709,62 @@ def run_notifier():
     # ----------------------------------------
     # 更新開始
     # ----------------------------------------
-    threading.Thread(target=update_label, daemon=True).start()
-    root.mainloop()
+    poller.start()
+    start_push()
+    timers = [core.every(WATCH_INTERVAL / 1000, check_settings),
+              core.every(PRESENCE_INTERVAL / 1000, check_presence)]
+    if commands is not None:
+        commands.connect(lambda command: bridge.post(handle_command, command))
+    check_stale()
+    bridge.start()
+    try:
+        root.mainloop()
+    finally:
+        release_windows()
+    if commands is not None:
+        commands.disconnect()
+    for timer in timers:
+        timer.cancel()
+    poller.stop()
+    if push:
+        push.stop()
 
 
 # ======================
 # タスクトレイ制御
 # ======================
+_icon_image = None
+_tray_badges = None
+
+
+def load_base_icon():
+    """縮小済みキャッシュがあればそれを、なければ icon.png を縮小して保存"""
+    from PIL import Image
+    if os.path.exists(ICON_CACHE_FILE) and \
+            os.path.getmtime(ICON_CACHE_FILE) >= os.path.getmtime(ICON_FILE):
+        return Image.open(ICON_CACHE_FILE).convert("RGBA")
+
+    img = Image.open(ICON_FILE)
+    img.draft("RGB", (TRAY_ICON_SIZE, TRAY_ICON_SIZE))  # JPEG 等は縮小展開
+    img = img.convert("RGBA")
+    img.thumbnail((TRAY_ICON_SIZE, TRAY_ICON_SIZE), Image.LANCZOS)
+    try:
+        img.save(ICON_CACHE_FILE)
+    except OSError as e:
+        log.warning("アイコンキャッシュ保存エラー: %s", e)
+    return img
+
+
 def get_icon_image():
+    global _icon_image
+    if _icon_image is not None:
+        return _icon_image
+
     if os.path.exists(ICON_FILE):
-        return Image.open(ICON_FILE)
+        _icon_image = load_base_icon()
+        return _icon_image
+
+    from PIL import Image, ImageDraw
 
     # モダンな透明背景のアイコンを作成
     img = Image.new("RGBA", (64, 64), (0, 0, 0, 0))
@@ -372,23 +780,96 @@ def get_icon_image():
     d.line((20, 28, 26, 34), fill=(255, 255, 255, 255), width=3, joint="curve")
     d.line((26, 34, 44, 22), fill=(255, 255, 255, 255), width=3, joint="curve")
 
+    _icon_image = img
     return img
 
 
-def start_tray():
-    def start(icon, item): threading.Thread(target=run_notifier, daemon=True).start()
-    def restart(icon, item): os.execl(sys.executable, sys.executable, *sys.argv)
-    def exit_app(icon, item): icon.stop(); os._exit(0)
+def get_tray_image(count, color):
+    """ベースアイコンの右下に件数バッジを重ねた画像"""
+    global _tray_badges
+    if _tray_badges is None:
+        from badge import BadgeRenderer
+        _tray_badges = BadgeRenderer(maxsize=16, label=None)
+    base = get_icon_image()
+    img = base.copy()
+    offset = base.width - TRAY_BADGE_SIZE
+    img.alpha_composite(_tray_badges.render(TRAY_BADGE_SIZE, color, count), (offset, offset))
+    return img
+
+
+def start_tray(instance=None):
+    """instance（SingleInstance）を渡すと、2つ目の起動からの指示を受け付ける"""
+    running = threading.Lock()
+    commands = Inbox()  # 監視ループの起動前・再起動中に届いた指示は溜めておく
 
+    def launch_notifier():
+        """監視ループを起動（既に動いている場合は二重に起動しない）"""
+        if not running.acquire(blocking=False):
+            log.info("既に起動中です")
+            return
+
+        def target():
+            try:
+                run_notifier(update_icon, commands)
+            finally:
+                running.release()
+        threading.Thread(target=target, daemon=True).start()
+
+    def release():
+        """終了・再起動の前に設定とログを書き出し、ロックを手放す"""
+        flush_settings()
+        stop_logging()
+        if instance is not None:
+            instance.close()
+
+    def quit_app():
+        release()
+        if icon is not None:
+            icon.stop()
+        os._exit(0)
+
+    def on_command(command):
+        """IPC スレッドから呼ばれる（Tk の操作は監視ループ側で TkBridge 経由で行う）"""
+        if command == "quit":
+            threading.Timer(0.2, quit_app).start()  # 返信を送ってから終了
+            return "ok"
+        if not running.locked():
+            launch_notifier()  # バッジを閉じていた場合は起動し直す
+        commands.put(command)
+        return "ok"
+
+    def start(icon, item): launch_notifier()
+    def restart(icon, item): release(); os.execl(sys.executable, sys.executable, *sys.argv)
+    def exit_app(icon, item): quit_app()
+    def show_metrics(icon, item): icon.notify(get_metrics().summary(), "承認通知 計測値")
+
+    icon = None
+    shown = {"state": None, "pushed": None}
+
+    def update_icon(count, color):
+        """表示中の件数・色が変わった時だけ pystray へ画像を渡す"""
+        shown["state"] = (count, color)
+        if icon is None or shown["pushed"] == shown["state"]:
+            return  # トレイ作成前の更新は作成後にまとめて反映
+        shown["pushed"] = shown["state"]
+        icon.icon = get_tray_image(count, color)
+        icon.title = f"承認通知（承認待ち {count} 件）"
+
+    # 🔸 デフォルトで起動状態にする（バッジを先に表示してからトレイを準備）
+    launch_notifier()
+    if instance is not None:
+        instance.serve(on_command)
+
+    import pystray
     icon = pystray.Icon("approval_notifier", get_icon_image(), "承認通知")
     icon.menu = pystray.Menu(
         pystray.MenuItem("起動", start),
         pystray.MenuItem("再起動", restart),
+        pystray.MenuItem("計測値", show_metrics),
         pystray.MenuItem("終了", exit_app)
     )
-
-    # 🔸 デフォルトで起動状態にする
-    threading.Thread(target=run_notifier, daemon=True).start()
+    if shown["state"]:
+        update_icon(*shown["state"])
     icon.run()
 
 
@@ -396,4 +877,21 @@ def start_tray():
 # メイン実行
 # ======================
 if __name__ == "__main__":
-    start_tray()
+    if "--relay" in sys.argv:
+        # 拠点リレーサーバーとして起動（GUIなし）
+        from relay import main as relay_main
+        relay_main([a for a in sys.argv[1:] if a != "--relay"])
+    elif "--headless" in sys.argv:
+        # 画面なしで監視し、イベントを標準出力などへ出す
+        from headless import main as headless_main
+        sys.exit(headless_main([a for a in sys.argv[1:] if a != "--headless"]))
+    elif "--measure-startup" in sys.argv:
+        start_tray()
+    else:
+        instance = SingleInstance()
+        if not instance.acquire():
+            # 既に起動中：GUI は作らず指示（既定はポップアップ表示）を送って終了
+            reply = send_command(parse_command(sys.argv))
+            sys.exit(0 if reply == "ok" else 1)
+        setup_logging()
+        start_tray(instance)
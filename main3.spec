@@ -1,4 +1,20 @@
 # -*- mode: python ; coding: utf-8 -*-
+# 起動時間重視のビルド設定
+#   pyinstaller main3.spec                          … 1ファイル版（従来どおり）
+#   set APPROVAL_NOTIFY_ONEDIR=1 && pyinstaller main3.spec
+#                                                   … フォルダ版（起動時の一時展開なし）
+# どちらも UPX 圧縮は行わない（起動のたびに展開コストがかかるため）
+import os
+
+ONEDIR = os.environ.get("APPROVAL_NOTIFY_ONEDIR") == "1"
+
+# 実行時に使わない大きなモジュールを同梱しない
+EXCLUDES = [
+    'numpy', 'matplotlib', 'IPython',
+    'PyQt5', 'PyQt6', 'PySide2', 'PySide6',
+    'unittest', 'doctest', 'pydoc', 'lib2to3', 'test', 'tkinter.test',
+    'xmlrpc',
+]
 
 
 a = Analysis(
@@ -10,30 +26,59 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=EXCLUDES,
     noarchive=False,
     optimize=0,
 )
 pyz = PYZ(a.pure)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
-    name='main3',
-    debug=False,
-    bootloader_ignore_signals=False,
-    strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
-    console=False,
-    disable_windowed_traceback=False,
-    argv_emulation=False,
-    target_arch=None,
-    codesign_identity=None,
-    entitlements_file=None,
-    icon=['icon.png'],
-)
+if ONEDIR:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        [],
+        exclude_binaries=True,
+        name='main3',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=False,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+        icon=['icon.png'],
+    )
+    coll = COLLECT(
+        exe,
+        a.binaries,
+        a.datas,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        name='main3',
+    )
+else:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        name='main3',
+        debug=False,
+        bootloader_ignore_signals=False,
+        strip=False,
+        upx=False,
+        upx_exclude=[],
+        runtime_tmpdir=None,
+        console=False,
+        disable_windowed_traceback=False,
+        argv_emulation=False,
+        target_arch=None,
+        codesign_identity=None,
+        entitlements_file=None,
+        icon=['icon.png'],
+    )
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ポーリング処理の計測値
+・取得ごとの DNS / 接続 / TLS / 合計時間、ステータス、受信サイズ
+・バッジ描画時間、ポップアップ表示回数
+・直近の値はリングバッファに保持し、JSON / Prometheus 形式で出力
+・metrics_port を設定すると 127.0.0.1 で HTTP 公開（/metrics, /metrics.json）
+・スレッド数とループの起床回数（core_wakeups / ui_wakeups）も出力し、待機中の負荷を確認できる
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+RING_SIZE = 256
+
+
+def _quantile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Metrics:
+    def __init__(self, size=RING_SIZE):
+        self.polls = deque(maxlen=size)
+        self.renders = deque(maxlen=size)
+        self.counters = {"polls": 0, "errors": 0, "not_modified": 0,
+                         "connections": 0, "popups": 0, "renders": 0}
+        self._lock = threading.Lock()
+
+    def record_poll(self, status, total, size, dns=0.0, connect=0.0, tls=0.0,
+                    not_modified=False, error=None):
+        with self._lock:
+            self.polls.append({"time": time.time(), "status": status, "total": total,
+                               "dns": dns, "connect": connect, "tls": tls, "size": size,
+                               "error": str(error) if error else None})
+            self.counters["polls"] += 1
+            if status != 200 and status != 304:
+                self.counters["errors"] += 1
+            if not_modified:
+                self.counters["not_modified"] += 1
+            if connect:
+                self.counters["connections"] += 1
+
+    def record_render(self, seconds):
+        with self._lock:
+            self.renders.append(seconds)
+            self.counters["renders"] += 1
+
+    def incr(self, name):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            polls = list(self.polls)
+            renders = list(self.renders)
+            counters = dict(self.counters)
+        totals = [p["total"] for p in polls]
+        return {
+            "counters": counters,
+            "last_poll": polls[-1] if polls else None,
+            "poll_seconds": {"p50": _quantile(totals, 0.5), "p95": _quantile(totals, 0.95)},
+            "render_seconds": {"p50": _quantile(renders, 0.5), "p95": _quantile(renders, 0.95)},
+            "recent_polls": polls,
+            "threads": threading.active_count(),
+        }
+
+    def summary(self):
+        """トレイメニューで表示する短い要約"""
+        snap = self.snapshot()
+        c, last = snap["counters"], snap["last_poll"]
+        lines = [f"取得 {c['polls']} 回（失敗 {c['errors']} / 304 {c['not_modified']} / 新規接続 {c['connections']}）",
+                 f"応答 p50 {snap['poll_seconds']['p50'] * 1000:.0f}ms / p95 {snap['poll_seconds']['p95'] * 1000:.0f}ms",
+                 f"描画 p50 {snap['render_seconds']['p50'] * 1000:.1f}ms / ポップアップ {c['popups']} 回",
+                 f"スレッド {snap['threads']} / 起床 ループ {c.get('core_wakeups', 0)} 回・"
+                 f"画面 {c.get('ui_wakeups', 0)} 回"]
+        if last:
+            lines.append(f"直近 {last['status']}（{last['size']} bytes）")
+        return "\n".join(lines)
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, default=str)
+
+    def to_prometheus(self):
+        snap = self.snapshot()
+        out = []
+        for name, value in snap["counters"].items():
+            out.append(f"# TYPE approval_notify_{name}_total counter")
+            out.append(f"approval_notify_{name}_total {value}")
+        out.append("# TYPE approval_notify_poll_seconds summary")
+        for q, key in (("0.5", "p50"), ("0.95", "p95")):
+            out.append(f'approval_notify_poll_seconds{{quantile="{q}"}} {snap["poll_seconds"][key]:.6f}')
+        out.append("# TYPE approval_notify_render_seconds summary")
+        for q, key in (("0.5", "p50"), ("0.95", "p95")):
+            out.append(f'approval_notify_render_seconds{{quantile="{q}"}} {snap["render_seconds"][key]:.6f}')
+        out.append("# TYPE approval_notify_threads gauge")
+        out.append(f"approval_notify_threads {snap['threads']}")
+        last = snap["last_poll"]
+        if last:
+            out.append("# TYPE approval_notify_last_poll_seconds gauge")
+            for phase in ("dns", "connect", "tls", "total"):
+                out.append(f'approval_notify_last_poll_seconds{{phase="{phase}"}} {last[phase]:.6f}')
+            out.append("# TYPE approval_notify_last_status gauge")
+            out.append(f"approval_notify_last_status {last['status'] or 0}")
+            out.append("# TYPE approval_notify_last_payload_bytes gauge")
+            out.append(f"approval_notify_last_payload_bytes {last['size']}")
+        return "\n".join(out) + "\n"
+
+
+async def serve_metrics(metrics, port, host="127.0.0.1"):
+    """計測値を HTTP で公開（asyncio ループ上で待ち受け）。/metrics は Prometheus、/metrics.json は JSON
+    1リクエストごとに応答して切断する（Keep-Alive なし）"""
+    import asyncio
+
+    async def handle(reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            while await asyncio.wait_for(reader.readline(), 5) not in (b"\r\n", b"\n", b""):
+                pass  # ヘッダーは使わない
+            parts = request.decode("latin-1").split()
+            path = parts[1] if len(parts) > 1 else ""
+            if path.startswith("/metrics.json"):
+                status, body, ctype = "200 OK", metrics.to_json(), "application/json; charset=utf-8"
+            elif path.startswith("/metrics"):
+                status, body, ctype = "200 OK", metrics.to_prometheus(), "text/plain; version=0.0.4"
+            else:
+                status, body, ctype = "404 Not Found", "not found\n", "text/plain"
+            data = body.encode("utf-8")
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {ctype}\r\n"
+                         f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("latin-1")
+                         + data)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    """プロセス内で共有する Metrics を返す"""
+    return _metrics
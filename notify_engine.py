@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+通知判定エンジン
+・レスポンスごとに前回との差分（新規・解消・緊急度の上昇）を計算
+・API が items（id 付きの明細）を返す場合は id 単位で判定し、通知済みの申請は再通知しない
+・ポップアップは最短間隔で間引き、間引いた分は次に表示できる時にまとめて通知
+"""
+
+import time
+from collections import namedtuple
+
+POPUP_MIN_INTERVAL = 60  # ポップアップの最短間隔（秒）
+LEVELS = {"danger": 2, "alert": 1}  # items の level（それ以外は通常扱い）
+
+# new       : 新たに届いた申請数
+# resolved  : 承認・取り下げなどで消えた申請数
+# escalated : 緊急度が上がった申請数（通常→期限間近→至急）
+# first     : 起動後最初のレスポンスか
+Delta = namedtuple("Delta", "new resolved escalated first")
+
+
+def _counts(data):
+    return (data.get("order_requests_count", 0),
+            data.get("danger_count", 0),
+            data.get("alert_count", 0))
+
+
+def _levels(data):
+    """items があれば {id: 緊急度} を返す。なければ None"""
+    items = data.get("items")
+    if not isinstance(items, list) or not all(isinstance(i, dict) and "id" in i for i in items):
+        return None
+    return {i["id"]: LEVELS.get(i.get("level"), 0) for i in items}
+
+
+class NotificationEngine:
+    """
+    process(data) でレスポンスを渡すと (Delta, ポップアップを出すか) を返す。
+    baseline に前回終了時の値を渡すと、起動直後も差分がある時だけ通知する。
+    popups / suppressed で表示・間引きの回数を参照できる。
+    """
+
+    def __init__(self, min_interval=POPUP_MIN_INTERVAL, baseline=None, clock=time.monotonic):
+        self.min_interval = min_interval
+        self.clock = clock
+        self.popups = 0
+        self.suppressed = 0
+        self.last_delta = None
+        self._baseline = baseline
+        self._prev = baseline
+        self._first = True
+        self._pending = False
+        self._last_popup = None
+        self._notified = set()
+
+    def process(self, data):
+        delta = self._diff(self._prev, data, self._first)
+        self._prev = data
+        self._first = False
+        self.last_delta = delta
+
+        if delta.first:
+            # 前回値がなければ初回は必ず表示、あれば件数が変わっている時のみ
+            wanted = (self._baseline is None or delta.new > 0
+                      or _counts(self._baseline) != _counts(data))
+        else:
+            wanted = delta.new > 0 or delta.escalated > 0
+
+        if not (wanted or self._pending):
+            return delta, False
+        now = self.clock()
+        if self._last_popup is not None and now - self._last_popup < self.min_interval:
+            self._pending = True
+            self.suppressed += 1
+            return delta, False
+        self._pending = False
+        self._last_popup = now
+        self.popups += 1
+        return delta, True
+
+    def _diff(self, prev, data, first):
+        levels = _levels(data)
+        prev_levels = _levels(prev) if prev else None
+        if levels is not None:
+            # id 単位の差分（通知済みの id は新規として数えない）
+            old = prev_levels or {}
+            new = [i for i in levels if i not in old and i not in self._notified]
+            resolved = [i for i in old if i not in levels]
+            escalated = [i for i, lv in levels.items() if i in old and lv > old[i]]
+            self._notified.update(levels)
+            if len(self._notified) > 10000:
+                self._notified = set(levels)
+            return Delta(len(new), len(resolved), len(escalated), first)
+
+        # 件数のみの差分
+        total, danger, alert = _counts(data)
+        p_total, p_danger, p_alert = _counts(prev) if prev else (0, 0, 0)
+        return Delta(max(0, total - p_total), max(0, p_total - total),
+                     max(0, danger - p_danger) + max(0, alert - p_alert), first)
+
+
+def replay(trace, interval=60, min_interval=POPUP_MIN_INTERVAL, baseline=None):
+    """記録したレスポンス列を interval 秒間隔で流し、表示されるポップアップ数を返す"""
+    now = [0.0]
+    engine = NotificationEngine(min_interval, baseline, clock=lambda: now[0])
+    for data in trace:
+        engine.process(data)
+        now[0] += interval
+    return engine.popups
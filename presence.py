@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+在席状態の判定
+・最後の操作からの経過時間と画面ロックを OS から取得し、active / idle / away を判定
+・idle の間は取得間隔を延ばし、away（ロック中・長時間の離席）の間は取得を止める
+・操作が再開されたら即座に取得し、戻った時点でバッジを最新にする
+・取得方法は差し替え可能（Windows: GetLastInputInfo、Linux: X11 の XScreenSaver、試験用: StubPresence）
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import sys
+
+IDLE_AFTER = 600        # 無操作がこの秒数を超えたら idle
+AWAY_AFTER = 1800       # 無操作がこの秒数を超えたら away（ロック中は即 away）
+IDLE_FACTOR = 4         # idle 中の取得間隔の倍率
+PRESENCE_INTERVAL = 5000  # 在席状態の確認間隔（ミリ秒）
+
+ACTIVE, IDLE, AWAY = "active", "idle", "away"
+
+log = logging.getLogger(__name__)
+
+
+# ======================
+# 取得方法
+# ======================
+class WindowsPresence:
+    """GetLastInputInfo で無操作時間、OpenInputDesktop でロック中かを判定"""
+
+    DESKTOP_SWITCHDESKTOP = 0x0100
+
+    def __init__(self):
+        from ctypes import wintypes
+
+        class LASTINPUTINFO(ctypes.Structure):
+            _fields_ = [("cbSize", wintypes.UINT), ("dwTime", wintypes.DWORD)]
+
+        self._user32 = ctypes.windll.user32
+        self._kernel32 = ctypes.windll.kernel32
+        self._kernel32.GetTickCount.restype = wintypes.DWORD
+        self._user32.OpenInputDesktop.restype = ctypes.c_void_p
+        self._user32.CloseDesktop.argtypes = [ctypes.c_void_p]
+        self._info = LASTINPUTINFO()
+        self._info.cbSize = ctypes.sizeof(LASTINPUTINFO)
+
+    def idle_seconds(self):
+        if not self._user32.GetLastInputInfo(ctypes.byref(self._info)):
+            return 0.0
+        # GetTickCount は約49日で一周するため差分は 32bit で計算
+        return ((self._kernel32.GetTickCount() - self._info.dwTime) & 0xFFFFFFFF) / 1000
+
+    def locked(self):
+        # ロック画面（セキュアデスクトップ）の間は入力デスクトップを開けない
+        desktop = self._user32.OpenInputDesktop(0, False, self.DESKTOP_SWITCHDESKTOP)
+        if not desktop:
+            return True
+        self._user32.CloseDesktop(desktop)
+        return False
+
+
+class X11Presence:
+    """libXss の XScreenSaverQueryInfo で無操作時間とスクリーンセーバー（画面オフ）を判定"""
+
+    SCREEN_SAVER_ON = 1
+
+    def __init__(self):
+        class XScreenSaverInfo(ctypes.Structure):
+            _fields_ = [("window", ctypes.c_ulong), ("state", ctypes.c_int),
+                        ("kind", ctypes.c_int), ("til_or_since", ctypes.c_ulong),
+                        ("idle", ctypes.c_ulong), ("eventMask", ctypes.c_ulong)]
+
+        xlib_name, xss_name = ctypes.util.find_library("X11"), ctypes.util.find_library("Xss")
+        if not xlib_name or not xss_name:
+            raise OSError("libX11 / libXss が見つかりません")
+        xlib = ctypes.cdll.LoadLibrary(xlib_name)
+        self._xss = ctypes.cdll.LoadLibrary(xss_name)
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        self._xss.XScreenSaverAllocInfo.restype = ctypes.POINTER(XScreenSaverInfo)
+        self._xss.XScreenSaverQueryInfo.argtypes = [ctypes.c_void_p, ctypes.c_ulong,
+                                                    ctypes.POINTER(XScreenSaverInfo)]
+        self._display = xlib.XOpenDisplay(None)
+        if not self._display:
+            raise OSError("X サーバーに接続できません")
+        self._root = xlib.XDefaultRootWindow(self._display)
+        self._info = self._xss.XScreenSaverAllocInfo()
+
+    def _query(self):
+        if not self._xss.XScreenSaverQueryInfo(self._display, self._root, self._info):
+            raise OSError("XScreenSaverQueryInfo に失敗")
+        return self._info.contents
+
+    def idle_seconds(self):
+        return self._query().idle / 1000
+
+    def locked(self):
+        return self._query().state == self.SCREEN_SAVER_ON
+
+
+class StubPresence:
+    """試験・シミュレーション用。idle / is_locked を書き換えて使う"""
+
+    def __init__(self, idle=0.0, is_locked=False):
+        self.idle = idle
+        self.is_locked = is_locked
+
+    def idle_seconds(self):
+        return self.idle
+
+    def locked(self):
+        return self.is_locked
+
+
+def create_provider():
+    """この環境で使える取得方法を返す（使えなければ None = 常に在席扱い）"""
+    try:
+        if sys.platform == "win32":
+            return WindowsPresence()
+        return X11Presence()
+    except (OSError, AttributeError) as e:
+        log.info("在席判定は無効: %s", e)
+        return None
+
+
+# ======================
+# 判定
+# ======================
+class PresenceMonitor:
+    """
+    poll() で (状態, 復帰したか) を返す。idle_after / away_after が 0 の場合はその判定をしない。
+    provider が None なら常に active。
+    """
+
+    def __init__(self, provider, idle_after=IDLE_AFTER, away_after=AWAY_AFTER):
+        self.provider = provider
+        self.idle_after = idle_after
+        self.away_after = away_after
+        self.state = ACTIVE
+
+    def poll(self):
+        idle, locked = 0.0, False
+        if self.provider is not None:
+            try:
+                idle, locked = self.provider.idle_seconds(), self.provider.locked()
+            except OSError as e:
+                log.warning("在席状態の取得エラー: %s", e)
+        if locked or (self.away_after and idle >= self.away_after):
+            state = AWAY
+        elif self.idle_after and idle >= self.idle_after:
+            state = IDLE
+        else:
+            state = ACTIVE
+        returned = state == ACTIVE and self.state != ACTIVE
+        self.state = state
+        return state, returned
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+承認件数のプッシュ受信（Server-Sent Events / ロングポーリング）
+・件数が変わった瞬間にコールバックへ通知
+・接続が切れている間は connected が False になり、呼び出し側は通常ポーリングへ戻る
+・stop() は待たずに戻る（受信中のソケットを shutdown し、後始末は受信スレッドが行う）。
+  stop() の後に受信した値はコールバックへ渡さない
+"""
+
+import json
+import logging
+import socket
+import threading
+
+from approval_api import get_client
+
+RETRY_INTERVAL = 5      # 切断後の再接続待ち（秒）
+READ_TIMEOUT = 90       # SSE のハートビート / ロングポーリングの保留上限（秒）
+CONNECT_TIMEOUT = 10
+
+log = logging.getLogger(__name__)
+
+
+class PushListener:
+    """
+    mode="sse"      : push_url へ接続し続け、`data: {...}` 行を受け取るたびに通知
+    mode="longpoll" : If-None-Match 付きで GET し、変化時に 200、保留切れで 204/304 を受け取る
+    """
+
+    def __init__(self, url, user_id, on_data, mode="sse", session=None):
+        self.url = url
+        self.user_id = user_id
+        self.on_data = on_data
+        self.mode = mode
+        self.session = session  # 未指定なら受信スレッド上で共有クライアントのものを使う
+        self.connected = False
+        self._stop = threading.Event()
+        self._response = None
+        self._etag = None
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """受信を止める（Tk スレッドから呼ばれるため、受信スレッドの終了は待たない）
+        バッファ付きの読み込み中に close すると読み込み側のロックで待たされるため、
+        ソケットを shutdown して読み込みを終わらせ、レスポンスは受信スレッドが閉じる"""
+        self._stop.set()
+        sock = _socket_of(self._response)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # 既に切断済み
+
+    def _deliver(self, data):
+        if not self._stop.is_set():
+            self.on_data(data)
+
+    def _run(self):
+        if self.session is None:
+            self.session = get_client().session
+        while not self._stop.is_set():
+            try:
+                if self.mode == "longpoll":
+                    self._longpoll()
+                else:
+                    self._sse()
+            except Exception as e:
+                if not self._stop.is_set():
+                    log.warning("プッシュ切断: %s", e, extra={"mode": self.mode})
+            self.connected = False
+            self._stop.wait(RETRY_INTERVAL)
+
+    # ----------------------------------------
+    # Server-Sent Events
+    # ----------------------------------------
+    def _sse(self):
+        res = self.session.get(self.url, params={"user_id": self.user_id},
+                               headers={"Accept": "text/event-stream"},
+                               stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        self._response = res
+        try:
+            if self._stop.is_set():
+                return  # 接続中に stop された
+            res.raise_for_status()
+            self.connected = True
+            lines = []
+            # 既定のチャンク（512バイト）では小さなイベントが溜まるまで届かないため1バイト単位で読む
+            for line in res.iter_lines(chunk_size=1, decode_unicode=True):
+                if self._stop.is_set():
+                    return
+                if line:
+                    if line.startswith("data:"):
+                        lines.append(line[5:].lstrip())
+                    continue
+                # 空行でイベント確定（コメント行 ":" はハートビートとして無視）
+                if lines:
+                    self._deliver(json.loads("\n".join(lines)))
+                    lines = []
+        finally:
+            self._response = None
+            res.close()
+
+    # ----------------------------------------
+    # ロングポーリング
+    # ----------------------------------------
+    def _longpoll(self):
+        while not self._stop.is_set():
+            headers = {"If-None-Match": self._etag} if self._etag else {}
+            # ヘッダー受信後は stop() で本文の読み込みを打ち切れるよう stream で受ける
+            # （ヘッダー待ちの間に stop された場合は、届いた値を渡さずに終わる）
+            res = self.session.get(self.url, params={"user_id": self.user_id}, headers=headers,
+                                   stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+            self._response = res
+            try:
+                if res.status_code in (204, 304):
+                    self.connected = True
+                    continue
+                res.raise_for_status()
+                data = res.json()
+                self.connected = True
+                self._etag = res.headers.get("ETag")
+                self._deliver(data)
+            finally:
+                self._response = None
+                res.close()
+
+
+def _socket_of(res):
+    """受信中のレスポンスのソケット（requests → urllib3 → http.client の順にたどる）"""
+    try:
+        return res.raw._fp.fp.raw._sock
+    except AttributeError:
+        return None  # 未接続・受信済み（fp は本文を読み終えると None になる）
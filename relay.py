@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+拠点用 承認件数リレーサーバー
+・拠点内で1台だけ起動し、akioka.cloud へのアクセスはユーザーごとに TTL に1回だけ行う
+・各端末は approval-notify-setting.json の api_url をこのサーバーに向ける
+・ETag を付けて返すため、端末側は変化がなければ 304 で済む
+
+  python relay.py --port 8765 --ttl 30
+  main3.exe --relay --port 8765 --ttl 30
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import sys
+import threading
+import time
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from app_log import setup_logging
+from approval_api import API_URL, ApprovalClient
+
+DEFAULT_PORT = 8765
+DEFAULT_TTL = 30  # 秒
+
+log = logging.getLogger(__name__)
+
+# body: 端末へ返すJSON（bytes）、etag: body のハッシュ
+Entry = namedtuple("Entry", "data body etag fetched_at")
+
+
+class RelayCache:
+    """ユーザーごとの最新値を TTL の間保持する（同時アクセスでも上流へは1回）"""
+
+    def __init__(self, client, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.client = client
+        self.ttl = ttl
+        self.clock = clock
+        self.upstream_requests = 0
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """最新の Entry を返す。上流が失敗した場合は古い値、それもなければ None"""
+        with self._lock:
+            lock = self._locks.setdefault(user_id, threading.Lock())
+        with lock:
+            entry = self._entries.get(user_id)
+            if entry and self.clock() - entry.fetched_at < self.ttl:
+                return entry
+            self.upstream_requests += 1
+            data = self.client.fetch(user_id)
+            if data is None:
+                return entry
+            body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+            entry = Entry(data, body, etag, self.clock())
+            self._entries[user_id] = entry
+            return entry
+
+
+def make_handler(cache):
+    class RelayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-Alive で端末からの接続も使い回す
+        disable_nagle_algorithm = True  # ヘッダーと本文の分割送信で遅延しないように
+
+        def do_GET(self):
+            query = parse_qs(urlparse(self.path).query)
+            try:
+                if "user_ids" in query:
+                    user_ids = [int(u) for u in query["user_ids"][0].split(",") if u]
+                    self._send_batch(user_ids)
+                else:
+                    self._send_one(int(query["user_id"][0]))
+            except (KeyError, ValueError):
+                self._send(400, b'{"error": "user_id required"}')
+
+        def _send_one(self, user_id):
+            entry = cache.get(user_id)
+            if entry is None:
+                self._send(502, b'{"error": "upstream unavailable"}')
+            elif self.headers.get("If-None-Match") == entry.etag:
+                self._send(304, b"", entry.etag)
+            else:
+                self._send(200, entry.body, entry.etag)
+
+        def _send_batch(self, user_ids):
+            result = {}
+            for uid in user_ids:
+                entry = cache.get(uid)
+                if entry is not None:
+                    result[str(uid)] = entry.data
+            self._send(200, json.dumps(result, ensure_ascii=False).encode("utf-8"))
+
+        def _send(self, status, body, etag=None):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            if etag:
+                self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return RelayHandler
+
+
+def create_server(host="0.0.0.0", port=DEFAULT_PORT, ttl=DEFAULT_TTL, upstream=API_URL):
+    cache = RelayCache(ApprovalClient(api_url=upstream), ttl)
+    server = ThreadingHTTPServer((host, port), make_handler(cache))
+    server.daemon_threads = True
+    server.cache = cache
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="承認件数リレーサーバー")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--ttl", type=float, default=DEFAULT_TTL, help="キャッシュ保持秒数")
+    parser.add_argument("--upstream", default=API_URL, help="上流の承認API URL")
+    # main3.exe --relay から呼ばれた場合の --relay だけを除き、それ以外の誤り（--tll など）はエラーにする
+    argv = sys.argv[1:] if argv is None else argv
+    args = parser.parse_args([a for a in argv if a != "--relay"])
+
+    setup_logging()
+    server = create_server(args.host, args.port, args.ttl, args.upstream)
+    log.info("リレー起動: http://%s:%s/ → %s（TTL %s秒）", args.host, args.port, args.upstream, args.ttl)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+適応型ポーリングスケジューラ
+・API失敗 / HTTPエラー時は指数バックオフ
+・件数に変化がない間は間隔を徐々に延長
+・danger_count がある間は間隔を短縮
+・ランダムなゆらぎ（ジッター）で端末ごとのリクエストを分散
+・slowdown で全体の間隔を延ばす（離席中など）
+"""
+
+import random
+import time
+
+BACKOFF_FACTOR = 2.0    # 失敗1回ごとの倍率
+STABLE_FACTOR = 1.5     # 変化なし1回ごとの倍率
+DANGER_FACTOR = 0.5     # 至急案件がある間の倍率
+MAX_FACTOR = 8          # 基本間隔に対する上限倍率
+MIN_INTERVAL = 5        # 最短間隔（秒）
+JITTER = 0.1            # ±10% のゆらぎ
+
+
+class PollScheduler:
+    """
+    record(data) に取得結果（失敗時は None）を渡すと次回までの待ち秒数を返す。
+    判断内容は delay / next_fire / reason で参照できる。
+    clock / rand を差し替えればテストで時刻と乱数を固定できる。
+    """
+
+    def __init__(self, interval, max_interval=None, min_interval=MIN_INTERVAL,
+                 jitter=JITTER, clock=time.monotonic, rand=random.random):
+        self.interval = interval
+        self.max_interval = max_interval or interval * MAX_FACTOR
+        self.min_interval = min(min_interval, interval)
+        self.jitter = jitter
+        self.clock = clock
+        self.rand = rand
+        self.failures = 0
+        self.stable = 0
+        self.last_counts = None
+        self.slowdown = 1  # 間隔全体への倍率（上限の適用後に掛ける）
+        self.delay = 0
+        self.next_fire = clock()
+        self.reason = "起動"
+
+    def set_interval(self, interval, max_interval=None, min_interval=MIN_INTERVAL):
+        """設定変更時に基本間隔を差し替える（失敗回数などの状態は維持）"""
+        self.interval = interval
+        self.max_interval = max_interval or interval * MAX_FACTOR
+        self.min_interval = min(min_interval, interval)
+
+    def reset(self):
+        """監視対象が変わった時に、前の対象の結果から決めた状態（失敗・変化なしの回数）を捨てる"""
+        self.failures = 0
+        self.stable = 0
+        self.last_counts = None
+
+    def record(self, data):
+        """取得結果から次回の実行時刻を決める"""
+        if not data:
+            self.failures += 1
+            # 長時間のオフラインでも桁あふれしないよう指数は上限で打ち切る
+            base = self.interval * BACKOFF_FACTOR ** min(self.failures, 16)
+            return self._schedule(base, f"バックオフ（連続失敗 {self.failures} 回）")
+
+        self.failures = 0
+        counts = (data.get("order_requests_count", 0),
+                  data.get("danger_count", 0),
+                  data.get("alert_count", 0))
+        self.stable = self.stable + 1 if counts == self.last_counts else 0
+        self.last_counts = counts
+
+        if counts[1] > 0:
+            return self._schedule(self.interval * DANGER_FACTOR, "至急案件あり")
+        if self.stable:
+            return self._schedule(self.interval * STABLE_FACTOR ** min(self.stable, 16),
+                                  f"変化なし（{self.stable} 回連続）")
+        return self._schedule(self.interval, "通常")
+
+    def skip(self, reason):
+        """取得を行わなかった回（プッシュ接続中など）は基本間隔で再確認する"""
+        return self._schedule(self.interval, reason)
+
+    def _schedule(self, base, reason):
+        base = max(self.min_interval, min(self.max_interval, base)) * self.slowdown
+        if self.slowdown != 1:
+            reason += f" ×{self.slowdown}"
+        self.delay = base * (1 + self.jitter * (2 * self.rand() - 1))
+        self.next_fire = self.clock() + self.delay
+        self.reason = reason
+        return self.delay
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+設定ファイル（approval-notify-setting.json）の読み書き
+・一時ファイルに書いてから置き換えるため、書き込み中の停止でもファイルが壊れない
+・ドラッグ終了やリサイズなどの連続した保存はまとめて1回、別スレッドで書き込む
+・読み込み時に型・範囲を検証し、旧形式の settings.json（main2.py）も取り込む
+・更新時刻を監視し、外部（手動編集・配布ツール）での変更を再起動なしで取り込む
+  （このプロセス自身が書き込んだ分は取り込み直さない）
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+SETTING_FILE = "approval-notify-setting.json"
+LEGACY_SETTING_FILE = "settings.json"  # main2.py の旧形式 {"x", "y", "size"}
+SAVE_DELAY = 1.0  # 保存をまとめる待ち時間（秒）
+WATCH_INTERVAL = 2000  # 設定ファイルの更新確認間隔（ミリ秒）
+
+log = logging.getLogger(__name__)
+
+SIZE_MIN, SIZE_MAX = 80, 300
+REFRESH_MIN = 5
+
+DEFAULT_SETTING = {
+    "user_id": 2,
+    "api_url": None,
+    "user_ids": None,
+    "batch_url": None,
+    "items_url": None,
+    "size": 120,
+    "x": None,
+    "y": None,
+    "refresh_interval": 60,
+    "push_url": None,
+    "push_mode": "sse",
+    "stale_after": 600,
+    "popup_min_interval": 60,
+    "metrics_port": None,
+    "idle_after": 600,
+    "away_after": 1800
+}
+
+
+# ======================
+# 検証・移行
+# ======================
+def _as_int(value, default, lo=None, hi=None, allow_none=False):
+    if value is None and allow_none:
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        log.warning("設定値が不正なため既定値を使用: %r", value)
+        return default
+    if lo is not None:
+        value = max(lo, value)
+    if hi is not None:
+        value = min(hi, value)
+    return value
+
+
+def validate_settings(data):
+    """不足キーを補い、型・範囲を揃えた新しい dict を返す（未知のキーはそのまま残す）"""
+    result = dict(DEFAULT_SETTING)
+    result.update(data)
+    result["user_id"] = _as_int(result["user_id"], DEFAULT_SETTING["user_id"])
+    result["size"] = _as_int(result["size"], DEFAULT_SETTING["size"], SIZE_MIN, SIZE_MAX)
+    result["x"] = _as_int(result["x"], None, allow_none=True)
+    result["y"] = _as_int(result["y"], None, allow_none=True)
+    result["refresh_interval"] = _as_int(result["refresh_interval"],
+                                         DEFAULT_SETTING["refresh_interval"], REFRESH_MIN)
+    result["stale_after"] = _as_int(result["stale_after"], DEFAULT_SETTING["stale_after"], 0)
+    result["popup_min_interval"] = _as_int(result["popup_min_interval"],
+                                           DEFAULT_SETTING["popup_min_interval"], 0)
+    if isinstance(result["user_ids"], list) and result["user_ids"]:
+        result["user_ids"] = [_as_int(u, result["user_id"]) for u in result["user_ids"]]
+    else:
+        result["user_ids"] = None
+    result["idle_after"] = _as_int(result["idle_after"], DEFAULT_SETTING["idle_after"], 0)
+    result["away_after"] = _as_int(result["away_after"], DEFAULT_SETTING["away_after"], 0)
+    result["metrics_port"] = _as_int(result["metrics_port"], None, 1, 65535, allow_none=True)
+    for key in ("api_url", "push_url", "batch_url", "items_url"):
+        if not isinstance(result[key], str) or not result[key]:
+            result[key] = None
+    if result["push_mode"] not in ("sse", "longpoll"):
+        result["push_mode"] = DEFAULT_SETTING["push_mode"]
+    return result
+
+
+# ======================
+# 読み込み
+# ======================
+def load_settings(path=SETTING_FILE):
+    if not os.path.exists(path):
+        data = dict(DEFAULT_SETTING)
+        if os.path.exists(LEGACY_SETTING_FILE):
+            # main2.py の settings.json から位置・サイズを引き継ぐ
+            try:
+                with open(LEGACY_SETTING_FILE, "r", encoding="utf-8") as f:
+                    data.update(json.load(f))
+                log.info("旧設定を移行: %s", LEGACY_SETTING_FILE)
+            except Exception as e:
+                log.warning("旧設定読み込みエラー: %s", e)
+        data = validate_settings(data)
+        write_settings(data, path)
+        return data
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return validate_settings(json.load(f))
+    except Exception as e:
+        # 壊れたファイルは黙って上書きせず、調査用に退避してから既定値で起動
+        log.error("設定読み込みエラー: %s", e, extra={"path": path})
+        try:
+            os.replace(path, path + ".broken")
+        except OSError:
+            pass
+        return dict(DEFAULT_SETTING)
+
+
+# ======================
+# 書き込み
+# ======================
+def write_settings(data, path=SETTING_FILE):
+    """一時ファイルへ書き込み → fsync → 置き換え（途中で止まっても元ファイルは無傷）"""
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        # 自分の書き込みを SettingsWatcher が外部の変更と取り違えないよう更新時刻を控える
+        _written[os.path.abspath(path)] = os.stat(path).st_mtime_ns
+        log.info("設定保存", extra={"path": path, "setting": data})
+    except Exception as e:
+        log.error("設定保存エラー: %s", e, extra={"path": path})
+
+
+_written = {}  # 絶対パス -> このプロセスが最後に書き込んだ時の更新時刻
+_pending = {}  # path -> (保存待ちの設定, 書き込む時刻)
+_cond = threading.Condition()
+_write_lock = threading.Lock()  # 取り出しから書き込みまでを1つずつ（古い内容で上書きしない）
+_writer = None  # 保存待ちがある間だけ動く書き込みスレッド
+
+
+def save_settings(data, path=SETTING_FILE, delay=SAVE_DELAY):
+    """保存を予約する。delay 秒以内の再保存はまとめて最後の内容だけ書き込む
+    （呼び出しごとにタイマーを作らず、1本の書き込みスレッドが期限を待つ）"""
+    global _writer
+    with _cond:
+        _pending[path] = (dict(data), time.monotonic() + delay)
+        if _writer is None:
+            _writer = threading.Thread(target=_write_loop, name="settings-writer", daemon=True)
+            _writer.start()
+        _cond.notify()
+
+
+def flush_settings():
+    """予約中の保存を直ちに書き込む（終了・再起動の直前に呼ぶ）"""
+    with _write_lock:
+        with _cond:
+            batch = [(path, data) for path, (data, _) in _pending.items()]
+            _pending.clear()
+            _cond.notify()
+        for path, data in batch:
+            write_settings(data, path)
+
+
+def _write_loop():
+    global _writer
+    while True:
+        with _cond:
+            while True:
+                if not _pending:
+                    _writer = None  # 保存待ちがなくなったら終了（次の保存で起動し直す）
+                    return
+                now = time.monotonic()
+                first = min(at for _, at in _pending.values())
+                if first <= now:
+                    break
+                _cond.wait(first - now)
+        with _write_lock:
+            with _cond:
+                now = time.monotonic()
+                batch = [(path, data) for path, (data, at) in _pending.items() if at <= now]
+                for path, _ in batch:
+                    del _pending[path]
+            for path, data in batch:
+                write_settings(data, path)
+
+
+# ======================
+# 変更監視
+# ======================
+class SettingsWatcher:
+    """
+    設定ファイルの更新時刻だけを確認し、変わっていれば読み直した設定を返す。
+    待機中のコストは os.stat 1回のみ。write_settings による自分の書き込みは変更として扱わない
+    （ドラッグ終了の保存を読み直すと、次のドラッグ中のバッジが保存時の位置へ戻るため）。
+    """
+
+    def __init__(self, path=SETTING_FILE):
+        self.path = path
+        self._mtime = self._stat()
+        self._failed = None  # 読めなかった時の更新時刻（同じ内容でログを繰り返さない）
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def poll(self):
+        """変更があれば新しい設定、なければ None
+        読めない場合（エディタが書き込み中など）はファイルに触れずに None を返し、次回また読む。
+        起動時の load_settings と違って退避・既定値への置き換えはしない"""
+        mtime = self._stat()
+        if mtime is None or mtime == self._mtime:
+            return None
+        if _written.get(os.path.abspath(self.path)) == mtime:
+            self._mtime = mtime
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = validate_settings(json.load(f))
+        except Exception as e:
+            if self._failed != mtime:
+                log.warning("設定読み込みエラー（次回再読み込み）: %s", e, extra={"path": self.path})
+                self._failed = mtime
+            return None
+        self._mtime = mtime
+        return data
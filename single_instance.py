@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+二重起動の防止と起動中のアプリへの指示
+・ユーザーごとに1つだけ起動できるようロックを取る（Windows: 名前付きミューテックス、それ以外: flock）
+・起動中のアプリは名前付きパイプ（Windows）/ Unix ソケットで指示を待ち受ける
+・2つ目の起動は GUI を作らずに指示（refresh / popup / reload / quit）を送って終了する
+・指示・返信は UTF-8 の短い文字列のまま送受信する（pickle は使わず、受け取った指示は COMMANDS と照合）
+
+  main3.exe            … 起動中ならポップアップを表示させる
+  main3.exe --refresh  … 起動中のアプリに即時取得させる
+  main3.exe --reload   … 設定ファイルを読み直させる
+  main3.exe --quit     … 起動中のアプリを終了させる
+"""
+
+import getpass
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+APP_NAME = "approval-notify"
+COMMANDS = ("refresh", "popup", "reload", "quit")
+DEFAULT_COMMAND = "popup"
+CONNECT_RETRY = 2.0  # 起動直後で待ち受け前の場合に再試行する秒数
+MAX_MESSAGE = 256    # 指示・返信の上限バイト数（超えたら受け取らない）
+# 同じユーザーのプロセス同士の取り違え防止用（秘密情報ではない）
+AUTHKEY = b"approval-notify-ipc"
+
+log = logging.getLogger(__name__)
+
+
+def _user():
+    try:
+        return getpass.getuser()
+    except Exception:
+        return "user"
+
+
+def ipc_address():
+    if sys.platform == "win32":
+        return rf"\\.\pipe\{APP_NAME}-{_user()}"
+    return os.path.join(_runtime_dir(), f"{APP_NAME}-{_user()}.sock")
+
+
+def _runtime_dir():
+    return os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+
+
+def parse_command(argv):
+    """--refresh などの指定を取り出す。指定がなければ popup"""
+    for command in COMMANDS:
+        if f"--{command}" in argv:
+            return command
+    return DEFAULT_COMMAND
+
+
+# ======================
+# ロック
+# ======================
+class SingleInstance:
+    """acquire() が True なら自分が唯一のインスタンス。serve() で指示の待ち受けを始める"""
+
+    def __init__(self, name=APP_NAME):
+        self.name = f"{name}-{_user()}"
+        self.address = ipc_address()
+        self._handle = None
+        self._listener = None
+
+    def acquire(self):
+        if sys.platform == "win32":
+            import ctypes
+            kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+            kernel32.CreateMutexW.restype = ctypes.c_void_p
+            handle = kernel32.CreateMutexW(None, False, f"Local\\{self.name}")
+            if not handle or ctypes.get_last_error() == 183:  # ERROR_ALREADY_EXISTS
+                if handle:
+                    kernel32.CloseHandle(ctypes.c_void_p(handle))
+                return False
+            self._handle = handle
+            return True
+
+        import fcntl
+        lock = open(os.path.join(_runtime_dir(), f"{self.name}.lock"), "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return False
+        self._handle = lock
+        return True
+
+    def serve(self, handler):
+        """指示を受けるたびに handler(command) を別スレッドで呼び、戻り値を返信する"""
+        from multiprocessing.connection import Listener
+        if sys.platform != "win32" and os.path.exists(self.address):
+            os.unlink(self.address)  # 前回異常終了時のソケットが残っていた場合
+        self._listener = Listener(self.address, authkey=AUTHKEY)
+        threading.Thread(target=self._accept_loop, args=(handler,), daemon=True).start()
+
+    def _accept_loop(self, handler):
+        while self._listener is not None:
+            try:
+                conn = self._listener.accept()
+            except Exception as e:
+                if self._listener is None:
+                    return
+                log.warning("IPC受信エラー: %s", e)
+                continue
+            try:
+                if conn.poll(5):
+                    command = conn.recv_bytes(MAX_MESSAGE).decode("utf-8", "replace")
+                    if command in COMMANDS:
+                        log.info("IPC指示を受信: %s", command)
+                        reply = handler(command)
+                    else:
+                        log.warning("不明なIPC指示: %r", command[:32])
+                        reply = "unknown"
+                    conn.send_bytes((reply or "ok").encode("utf-8"))
+            except Exception as e:
+                log.warning("IPC処理エラー: %s", e)
+            finally:
+                conn.close()
+
+    def close(self):
+        """待ち受けとロックを解放（再起動で新しいプロセスがロックを取れるように）"""
+        listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.close()
+        if self._handle is None:
+            return
+        if sys.platform == "win32":
+            import ctypes
+            ctypes.windll.kernel32.CloseHandle(ctypes.c_void_p(self._handle))
+        else:
+            self._handle.close()
+        self._handle = None
+
+
+# ======================
+# 送信側
+# ======================
+def send_command(command, retry=CONNECT_RETRY):
+    """起動中のアプリへ指示を送り、返信を返す（送れなければ None）"""
+    from multiprocessing.connection import Client
+    deadline = time.monotonic() + retry
+    while True:
+        try:
+            with Client(ipc_address(), authkey=AUTHKEY) as conn:
+                conn.send_bytes(command.encode("utf-8"))
+                if not conn.poll(10):
+                    return None
+                return conn.recv_bytes(MAX_MESSAGE).decode("utf-8", "replace")
+        except (OSError, EOFError):
+            # ロックを取ったアプリがまだ待ち受けを始めていない場合は少し待って再試行
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(0.1)
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+承認API のスタブサーバー（ベンチマーク・動作確認用）
+・/api/order_request/approval_requests?user_id=N を本番と同じ形式で返す
+  （?user_ids=2,5,7 なら batch_url と同じ {"2": {...}, "5": {...}} 形式で1回にまとめて返す）
+・応答遅延・エラー率・件数の推移を指定でき、ETag による 304 にも対応
+・件数の推移はユーザーごとにリクエストのたびに1つ進む（最後まで行ったら先頭へ）
+・/api/order_request/approval_items?user_id=N&page=P&per_page=M で現在の件数分の明細を返す
+・/api/order_request/approval_push?user_id=N で publish() した件数をプッシュで返す
+  （Accept: text/event-stream なら SSE、それ以外はロングポーリング：変化時 200 / 保留切れで 204）
+
+  python stub_api.py --port 8790 --latency 0.05 --error-rate 0.1 --counts 3:0:1,3:0:1,5:1:1
+  → approval-notify-setting.json の api_url を http://127.0.0.1:8790/api/order_request/approval_requests に
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+API_PATH = "/api/order_request/approval_requests"
+ITEMS_PATH = "/api/order_request/approval_items"
+PUSH_PATH = "/api/order_request/approval_push"
+DEFAULT_COUNTS = [(14, 8, 2)]  # main3.py の TEST_DATA と同じ値
+
+
+def parse_counts(text):
+    """"3:0:1,5:1:1" を [(総数, 至急, 期限間近), ...] にする"""
+    result = []
+    for part in text.split(","):
+        values = [int(v) for v in part.split(":")] + [0, 0]
+        result.append(tuple(values[:3]))
+    return result
+
+
+class StubServer:
+    """
+    latency    : 応答までの待ち秒数（jitter で ± のゆらぎ）
+    error_rate : 503 を返す割合（0〜1）
+    counts     : 件数の推移 [(総数, 至急, 期限間近), ...]
+    start() で別スレッドで待ち受け、url / requests / errors / connections（受け付けた接続数）で
+    状態を参照できる。
+    push_heartbeat : SSE のハートビート間隔（秒）、push_hold : ロングポーリングの保留上限（秒）
+    """
+
+    def __init__(self, port=0, host="127.0.0.1", latency=0.0, jitter=0.0, error_rate=0.0,
+                 counts=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.counts = counts or DEFAULT_COUNTS
+        self.requests = 0
+        self.errors = 0
+        self.not_modified = 0
+        self.connections = 0
+        self._rand = random.Random(seed)
+        self._steps = {}  # user_id -> 推移の位置
+        self._lock = threading.Lock()
+        self.push_heartbeat = 15.0
+        self.push_hold = 25.0
+        self._published = None  # (版, 件数)
+        self._changed = threading.Condition(self._lock)
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{API_PATH}"
+
+    @property
+    def items_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{ITEMS_PATH}"
+
+    @property
+    def push_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{PUSH_PATH}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def publish(self, data):
+        """プッシュで接続中のクライアントへ件数を送る"""
+        with self._changed:
+            version = self._published[0] + 1 if self._published else 1
+            self._published = (version, data)
+            self._changed.notify_all()
+
+    def wait_published(self, version, timeout):
+        """version より新しい件数が publish されるまで待ち、(版, 件数) を返す（保留切れは None）"""
+        with self._changed:
+            if not self._changed.wait_for(
+                    lambda: self._published and self._published[0] > version, timeout):
+                return None
+            return self._published
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def next_response(self, user_id):
+        """(ステータス, dict) を返す。エラー時は dict が None"""
+        status, result = self.batch_response([user_id])
+        return status, result and result[str(user_id)]
+
+    def batch_response(self, user_ids):
+        """複数ユーザー分を1リクエストとして返す：(ステータス, {"2": dict, ...})。エラー時は None"""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self.jitter * (2 * self._rand.random() - 1)
+            failed = self._rand.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            else:
+                result = {}
+                for user_id in user_ids:
+                    step = self._steps.get(user_id, 0)
+                    self._steps[user_id] = step + 1
+                    total, danger, alert = self.counts[step % len(self.counts)]
+                    result[str(user_id)] = {"order_requests_count": total, "danger_count": danger,
+                                            "alert_count": alert}
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            return 503, None
+        return 200, result
+
+    def items(self, user_id, page, per_page):
+        """直近に返した件数に合わせた明細（至急 → 期限間近 → 通常の順）"""
+        with self._lock:
+            step = max(0, self._steps.get(user_id, 0) - 1)
+            total, danger, alert = self.counts[step % len(self.counts)]
+        if self.latency > 0:
+            time.sleep(self.latency)
+        items = []
+        for n in range(page * per_page, min(total, (page + 1) * per_page)):
+            level = "danger" if n < danger else "alert" if n < danger + alert else None
+            items.append({"id": f"{user_id}-{n + 1}", "title": f"発注申請 #{n + 1}",
+                          "requester": f"申請者{n % 7 + 1}",
+                          "created_at": time.strftime("%Y-%m-%d", time.localtime(time.time() - n * 3600)),
+                          "level": level})
+        return {"items": items, "total": total, "page": page, "per_page": per_page}
+
+    def _make_handler(self):
+        stub = self
+
+        class StubHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # ヘッダーと本文を別々に送るため、Nagle が有効だと Keep-Alive 時に約40ms待たされる
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == API_PATH and "user_ids" in query:
+                    self._batch(query["user_ids"][0])
+                    return
+                try:
+                    user_id = int(query["user_id"][0])
+                except (KeyError, ValueError):
+                    self._send(400, b'{"error": "user_id required"}')
+                    return
+                if url.path == PUSH_PATH:
+                    if "text/event-stream" in self.headers.get("Accept", ""):
+                        self._sse()
+                    else:
+                        self._longpoll()
+                    return
+                if url.path == ITEMS_PATH:
+                    page = int(query.get("page", ["0"])[0])
+                    per_page = int(query.get("per_page", ["50"])[0])
+                    body = json.dumps(stub.items(user_id, page, per_page), ensure_ascii=False)
+                    self._send(200, body.encode("utf-8"))
+                    return
+                status, data = stub.next_response(user_id)
+                if data is None:
+                    self._send(status, b'{"error": "unavailable"}')
+                    return
+                body = json.dumps(data).encode("utf-8")
+                etag = '"%d-%d-%d"' % (data["order_requests_count"], data["danger_count"],
+                                       data["alert_count"])
+                if self.headers.get("If-None-Match") == etag:
+                    with stub._lock:
+                        stub.not_modified += 1
+                    self._send(304, b"", etag)
+                else:
+                    self._send(200, body, etag)
+
+            def _batch(self, text):
+                try:
+                    user_ids = [int(u) for u in text.split(",") if u]
+                except ValueError:
+                    self._send(400, b'{"error": "user_ids required"}')
+                    return
+                status, result = stub.batch_response(user_ids)
+                if result is None:
+                    self._send(status, b'{"error": "unavailable"}')
+                else:
+                    self._send(200, json.dumps(result).encode("utf-8"))
+
+            def _sse(self):
+                self.close_connection = True
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                version = stub._published[0] if stub._published else 0
+                try:
+                    while True:
+                        got = stub.wait_published(version, stub.push_heartbeat)
+                        if got is None:
+                            self.wfile.write(b": ping\n\n")
+                        else:
+                            version = got[0]
+                            self.wfile.write(b"data: " + json.dumps(got[1]).encode("utf-8") + b"\n\n")
+                        self.wfile.flush()
+                except OSError:
+                    pass  # クライアントが切断
+
+            def _longpoll(self):
+                etag = self.headers.get("If-None-Match", "")
+                try:
+                    version = int(etag.strip('"v'))
+                except ValueError:
+                    version = 0
+                got = stub.wait_published(version, stub.push_hold)
+                if got is None:
+                    self._send(204, b"")
+                else:
+                    self._send(200, json.dumps(got[1]).encode("utf-8"), f'"v{got[0]}"')
+
+            def _send(self, status, body, etag=None):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                if etag:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return StubHandler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="承認API スタブサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--latency", type=float, default=0.0, help="応答遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延のゆらぎ（±秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="503 を返す割合（0〜1）")
+    parser.add_argument("--counts", help="件数の推移（総数:至急:期限間近 をカンマ区切り）")
+    args = parser.parse_args(argv)
+
+    stub = StubServer(args.port, args.host, args.latency, args.jitter, args.error_rate,
+                      parse_counts(args.counts) if args.counts else None)
+    print(f"[INFO] スタブ起動: {stub.url}（明細: {stub.items_url}）")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stub.server.server_close()
+
+
+if __name__ == "__main__":
+    main()